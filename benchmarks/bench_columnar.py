@@ -0,0 +1,64 @@
+"""
+Compare the row and the columnar encoding of a MERGE_APPEND of 10000 cards:
+payload size, encode time and decode time (json.loads, plus expand_columns for
+the columnar payload).
+
+    PYTHONPATH=. python benchmarks/bench_columnar.py
+"""
+from dataclasses import dataclass
+import datetime
+from decimal import Decimal
+from enum import Enum
+import gzip
+import json
+import timeit
+
+from slotomania.core import Contract, Instruction, Operation, expand_columns
+
+
+class EntityTypes(Enum):
+    CARD = 1
+
+
+@dataclass
+class Card(Contract):
+    rank: int
+    suit: str
+    width: Decimal
+    played_at: datetime.datetime
+
+
+def main() -> None:
+    played_at = datetime.datetime(2000, 1, 1)
+    cards = [
+        Card(rank, "spades", Decimal("1.111"), played_at) for rank in range(10000)
+    ]
+
+    def encode(columnar: bool) -> bytes:
+        operation = Operation.MERGE_APPEND(EntityTypes.CARD, cards, columnar=columnar)
+        return Instruction([operation]).encode()
+
+    def decode(payload: bytes) -> list:
+        data = json.loads(payload)
+        return expand_columns(data["operations"][0]["target_value"])
+
+    rows, columns = encode(False), encode(True)
+    assert decode(rows) == decode(columns)
+
+    number = 10
+    for label, columnar, payload in [
+        ("rows:    ", False, rows),
+        ("columnar:", True, columns),
+    ]:
+        encode_time = timeit.timeit(lambda: encode(columnar), number=number)
+        decode_time = timeit.timeit(lambda: decode(payload), number=number)
+        print(
+            f"{label} {len(payload) / 1024:6.0f} KiB, "
+            f"{len(gzip.compress(payload)) / 1024:4.0f} KiB gzipped, "
+            f"encode {encode_time / number * 1000:6.2f} ms, "
+            f"decode {decode_time / number * 1000:6.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
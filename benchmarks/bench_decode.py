@@ -0,0 +1,81 @@
+"""
+Compare loading timestamp heavy payloads into real datetimes and Decimals with
+the compiled loaders against the previous way: load the strings with the
+legacy loader, then parse them by hand in the resolver with django's parsers.
+
+    PYTHONPATH=. python benchmarks/bench_decode.py
+"""
+from dataclasses import dataclass, replace
+import datetime
+from decimal import Decimal
+import timeit
+from typing import List
+
+from bench_load_from_dict import legacy_load_from_dict
+from django.utils import dateparse
+
+from slotomania.core import Contract, to_primitive
+
+
+@dataclass
+class Reading(Contract):
+    sensor: str
+    recorded_at: datetime.datetime
+    value: Decimal
+
+
+@dataclass
+class Readings(Contract):
+    readings: List[Reading]
+
+
+def make_payload(readings: int) -> dict:
+    start = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)
+    return to_primitive(
+        Readings(
+            [
+                Reading(
+                    sensor=f"sensor {number % 10}",
+                    recorded_at=start + datetime.timedelta(seconds=number),
+                    value=Decimal(number) / 100,
+                )
+                for number in range(readings)
+            ]
+        )
+    )
+
+
+def legacy_load(data: dict) -> Readings:
+    # Strings were passed through, every resolver parsed them itself
+    readings = legacy_load_from_dict(Readings, data)
+    return Readings(
+        [
+            replace(
+                reading,
+                recorded_at=dateparse.parse_datetime(reading.recorded_at),
+                value=Decimal(reading.value),
+            )
+            for reading in readings.readings
+        ]
+    )
+
+
+def main() -> None:
+    payload = make_payload(readings=10000)
+    assert Readings.load_from_dict(payload) == legacy_load(payload)
+    assert to_primitive(Readings.load_from_dict(payload)) == payload
+
+    number = 5
+    legacy = timeit.timeit(lambda: legacy_load(payload), number=number)
+    compiled = timeit.timeit(lambda: Readings.load_from_dict(payload), number=number)
+    validate = timeit.timeit(
+        lambda: Readings.validate(payload, formats=False), number=number
+    )
+    print(f"legacy:   {legacy / number * 1000:8.2f} ms per payload")
+    print(f"compiled: {compiled / number * 1000:8.2f} ms per payload")
+    print(f"speedup:  {legacy / compiled:8.2f}x")
+    print(f"validate: {validate / number * 1000:8.2f} ms per payload, included above")
+
+
+if __name__ == "__main__":
+    main()
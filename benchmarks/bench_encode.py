@@ -0,0 +1,85 @@
+"""
+Compare the registry based InstructionEncoder with the previous
+isinstance/asdict based one when flattening a large MERGE_APPEND.
+
+    PYTHONPATH=. python benchmarks/bench_encode.py
+"""
+from dataclasses import asdict, dataclass, is_dataclass
+import datetime
+import decimal
+from decimal import Decimal
+from enum import Enum
+import json
+import timeit
+import tracemalloc
+from typing import Any
+
+from slotomania.core import Contract, Instruction, InstructionEncoder, Operation
+
+
+class EntityTypes(Enum):
+    CARD = 1
+
+
+@dataclass
+class Card(Contract):
+    rank: int
+    width: Decimal
+    played_at: datetime.datetime
+
+
+class LegacyInstructionEncoder(json.JSONEncoder):
+    def default(self, obj) -> Any:
+        if isinstance(obj, Enum):
+            return obj.name
+        elif is_dataclass(obj):
+            return asdict(obj)
+        elif hasattr(obj, "isoformat"):
+            return obj.isoformat()
+        elif isinstance(obj, decimal.Decimal):
+            return str(obj)
+
+        return json.JSONEncoder.default(self, obj)
+
+
+def peak_memory(func) -> int:
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main() -> None:
+    played_at = datetime.datetime(2000, 1, 1)
+    instruction = Instruction(
+        [
+            Operation.MERGE_APPEND(
+                EntityTypes.CARD,
+                [Card(rank, Decimal("1.111"), played_at) for rank in range(10000)],
+            )
+        ]
+    )
+
+    def legacy():
+        return json.dumps(instruction, cls=LegacyInstructionEncoder)
+
+    def planned():
+        return json.dumps(instruction, cls=InstructionEncoder)
+
+    assert legacy() == planned()
+
+    number = 10
+    legacy_time = timeit.timeit(legacy, number=number)
+    planned_time = timeit.timeit(planned, number=number)
+    for label, func, elapsed in [
+        ("legacy: ", legacy, legacy_time),
+        ("planned:", planned, planned_time),
+    ]:
+        peak = peak_memory(func) / 1024
+        print(f"{label} {elapsed / number * 1000:8.2f} ms, peak {peak:8.0f} KiB")
+    print(f"speedup: {legacy_time / planned_time:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
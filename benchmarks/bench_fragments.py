@@ -0,0 +1,57 @@
+"""
+Encode an Instruction holding a lookup table of 10000 rates and a small
+per-request operation, with the table encoded on every request and spliced
+from a cached fragment.
+
+    PYTHONPATH=. python benchmarks/bench_fragments.py
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+from enum import Enum
+import json
+import timeit
+
+from slotomania.core import Contract, Instruction, Operation
+from slotomania.fragments import cached_fragment
+
+
+class EntityTypes(Enum):
+    RATE = 1
+    BALANCE = 2
+
+
+@dataclass
+class Rate(Contract):
+    id: int
+    currency: str
+    rate: Decimal
+
+
+@dataclass
+class Balance(Contract):
+    user: int
+    amount: Decimal
+
+
+def main() -> None:
+    rates = [Rate(number, f"C{number}", Decimal(number) / 7) for number in range(10000)]
+
+    def encode(fragment: bool) -> bytes:
+        table = cached_fragment("rates", 1, lambda: rates) if fragment else rates
+        return Instruction(
+            [
+                Operation.OVERWRITE(EntityTypes.RATE, table),
+                Operation.OVERWRITE(EntityTypes.BALANCE, [Balance(1, Decimal(10))]),
+            ]
+        ).encode()
+
+    assert json.loads(encode(True)) == json.loads(encode(False))
+
+    number = 20
+    for label, fragment in [("encoded: ", False), ("fragment:", True)]:
+        seconds = timeit.timeit(lambda: encode(fragment), number=number)
+        print(f"{label} {seconds / number * 1000:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
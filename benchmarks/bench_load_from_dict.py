@@ -0,0 +1,123 @@
+"""
+Compare the compiled Contract.load_from_dict against the previous
+implementation which re-inspected the class on every call.
+
+    PYTHONPATH=. python benchmarks/bench_load_from_dict.py
+"""
+from dataclasses import dataclass, is_dataclass
+import datetime
+from enum import Enum
+import timeit
+from typing import List, Optional, Union
+
+from slotomania.core import (
+    TYPE_MAP,
+    Contract,
+    is_field_required,
+    is_subclass,
+    to_primitive,
+)
+from slotomania.exceptions import MissingField
+
+
+class Gender(Enum):
+    male = 1
+    female = 2
+
+
+@dataclass
+class Address(Contract):
+    street: str
+
+
+@dataclass
+class Person(Contract):
+    name: str
+    gender: Gender
+    birth_date: datetime.datetime
+    addresses: Optional[List[Address]] = None
+
+
+@dataclass
+class Household(Contract):
+    name: str
+    people: List[Person]
+
+
+def legacy_load_from_dict(cls, data: dict):
+    kwargs = {}
+    annotation = cls.__init__.__annotations__
+    PRIMITIVES = list(TYPE_MAP.keys())
+
+    def convert_value(value, value_type):
+        if value_type in PRIMITIVES:
+            return value
+        elif is_subclass(value_type, Enum):
+            return value_type[value if isinstance(value, str) else value.name]
+        elif is_dataclass(value_type):
+            return legacy_load_from_dict(value_type, value)
+        elif getattr(value_type, "__origin__", None) == Union:
+            args = getattr(value_type, "__args__")
+            return convert_value(value, args[0])
+        elif value_type.__origin__ == list:
+            nested_type = value_type.__args__[0]
+            return [convert_value(item, nested_type) for item in value]
+        else:
+            raise Exception(f"not sure what to do with {value_type}: {value}")
+
+    for key in data:
+        if key in cls.get_fields():
+            arg_type = annotation[key]
+            kwargs[key] = convert_value(data[key], arg_type)
+
+    for name, field in cls.get_fields().items():
+        if is_field_required(field) and name not in data:
+            raise MissingField(field)
+
+    return cls(**kwargs)
+
+
+def make_payload(households: int, people: int, addresses: int) -> List[dict]:
+    return [
+        {
+            "name": f"household {h}",
+            "people": [
+                {
+                    "name": f"person {p}",
+                    "gender": "female" if p % 2 else "male",
+                    "birth_date": "2000-01-01T00:00:00",
+                    "addresses": [{"street": f"street {a}"} for a in range(addresses)],
+                }
+                for p in range(people)
+            ],
+        }
+        for h in range(households)
+    ]
+
+
+def main() -> None:
+    payload = make_payload(households=100, people=20, addresses=5)
+    # The legacy loader left datetimes as strings
+    assert to_primitive([Household.load_from_dict(item) for item in payload]) == (
+        to_primitive([legacy_load_from_dict(Household, item) for item in payload])
+    )
+
+    number = 5
+    legacy = timeit.timeit(
+        lambda: [legacy_load_from_dict(Household, item) for item in payload],
+        number=number,
+    )
+    compiled = timeit.timeit(
+        lambda: [Household.load_from_dict(item) for item in payload], number=number
+    )
+    validate = timeit.timeit(
+        lambda: [Household.validate(item) for item in payload], number=number
+    )
+    print(f"legacy:   {legacy / number * 1000:8.2f} ms per payload")
+    print(f"compiled: {compiled / number * 1000:8.2f} ms per payload")
+    print(f"speedup:  {legacy / compiled:8.2f}x")
+    print(f"validate: {validate / number * 1000:8.2f} ms per payload, included above")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Compare the json and msgpack codecs of InstructorView on a Decimal and
+datetime heavy MERGE_APPEND: payload size and encode/decode throughput.
+
+    PYTHONPATH=. python benchmarks/bench_msgpack.py
+"""
+from dataclasses import dataclass
+import datetime
+from decimal import Decimal
+from enum import Enum
+import timeit
+
+from slotomania.core import (
+    JSON_CODEC,
+    Contract,
+    Instruction,
+    MsgpackCodec,
+    Operation,
+)
+
+
+class EntityTypes(Enum):
+    TRADE = 1
+
+
+@dataclass
+class Trade(Contract):
+    id: int
+    price: Decimal
+    quantity: float
+    traded_at: datetime.datetime
+    fees: list
+
+
+def main() -> None:
+    start = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)
+    trades = [
+        Trade(
+            id=number,
+            price=Decimal(number) / 100,
+            quantity=number * 1.5,
+            traded_at=start + datetime.timedelta(seconds=number),
+            fees=[number % 7, number % 11, 0.25],
+        )
+        for number in range(10000)
+    ]
+    instruction = Instruction([Operation.MERGE_APPEND(EntityTypes.TRADE, trades)])
+
+    number = 10
+    for label, codec in [("json:   ", JSON_CODEC), ("msgpack:", MsgpackCodec())]:
+        payload = codec.dumps(instruction)
+        assert codec.loads(payload) == JSON_CODEC.loads(JSON_CODEC.dumps(instruction))
+        encode = timeit.timeit(lambda: codec.dumps(instruction), number=number)
+        decode = timeit.timeit(lambda: codec.loads(payload), number=number)
+        megabytes = len(payload) * number / 1024 / 1024
+        print(
+            f"{label} {len(payload) / 1024:6.0f} KiB, "
+            f"encode {megabytes / encode:6.1f} MiB/s, "
+            f"decode {megabytes / decode:6.1f} MiB/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Compare encoding 20000 users fetched as model instances and copied into
+contracts with iter_contracts and iter_rows: time and peak memory.
+
+    PYTHONPATH=. python benchmarks/bench_querysets.py
+"""
+from dataclasses import dataclass
+from enum import Enum
+import timeit
+import tracemalloc
+from typing import Callable, Iterable
+
+import django
+from django.conf import settings
+
+settings.configure(
+    DATABASES={"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}},
+    INSTALLED_APPS=["django.contrib.contenttypes", "django.contrib.auth"],
+)
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+
+from slotomania.core import Contract, Instruction, Operation  # noqa: E402
+from slotomania.querysets import iter_contracts, iter_rows  # noqa: E402
+
+
+class EntityTypes(Enum):
+    USER = 1
+
+
+@dataclass
+class UserRow(Contract):
+    id: int
+    username: str
+    email: str
+    is_active: bool
+
+
+def legacy_users() -> list:
+    return [
+        UserRow(user.id, user.username, user.email, user.is_active)
+        for user in User.objects.order_by("id")
+    ]
+
+
+def encode(users: Iterable) -> str:
+    instruction = Instruction([Operation.MERGE_APPEND(EntityTypes.USER, users)])
+    return "".join(instruction.iter_encode())
+
+
+def main() -> None:
+    call_command("migrate", verbosity=0)
+    User.objects.bulk_create(
+        User(username=f"user{number}", email=f"user{number}@example.com")
+        for number in range(20000)
+    )
+    queryset = User.objects.order_by("id")
+
+    cases = [
+        ("models:        ", lambda: iter(legacy_users())),
+        ("iter_contracts:", lambda: iter_contracts(UserRow, queryset)),
+        ("iter_rows:     ", lambda: iter_rows(UserRow, queryset)),
+    ]
+    expected = encode(cases[0][1]())
+    number = 5
+    for label, users in cases:
+        assert encode(users()) == expected
+        seconds = timeit.timeit(lambda: encode(users()), number=number)
+        print(
+            f"{label} {seconds / number * 1000:7.2f} ms, "
+            f"peak {peak_memory(lambda: encode(users())) / 1024 / 1024:6.2f} MiB"
+        )
+
+
+def peak_memory(function: Callable[[], object]) -> int:
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Compare encoding an Instruction straight into an InstructionResponse with the
+previous dumps/loads round trip followed by JsonResponse.
+
+    PYTHONPATH=. python benchmarks/bench_serialize.py
+"""
+from dataclasses import asdict, dataclass, is_dataclass
+import datetime
+import decimal
+from decimal import Decimal
+from enum import Enum
+import json
+import timeit
+from typing import Any, List
+
+from django.conf import settings
+
+settings.configure()
+
+from slotomania.core import (  # noqa: E402
+    Contract,
+    Instruction,
+    InstructionResponse,
+    JsonResponse,
+    Operation,
+)
+
+
+class EntityTypes(Enum):
+    HAND = 1
+
+
+@dataclass
+class Card(Contract):
+    rank: int
+    width: Decimal
+    played_at: datetime.datetime
+
+
+@dataclass
+class Hand(Contract):
+    player: str
+    cards: List[Card]
+
+
+class LegacyInstructionEncoder(json.JSONEncoder):
+    def default(self, obj) -> Any:
+        if isinstance(obj, Enum):
+            return obj.name
+        elif is_dataclass(obj):
+            return asdict(obj)
+        elif hasattr(obj, "isoformat"):
+            return obj.isoformat()
+        elif isinstance(obj, decimal.Decimal):
+            return str(obj)
+
+        return json.JSONEncoder.default(self, obj)
+
+
+def legacy_response(instruction: Instruction) -> JsonResponse:
+    return JsonResponse(
+        json.loads(json.dumps(instruction, cls=LegacyInstructionEncoder))
+    )
+
+
+def make_instruction(hands: int, cards: int) -> Instruction:
+    played_at = datetime.datetime(2000, 1, 1)
+    return Instruction(
+        [
+            Operation.MERGE_APPEND(
+                EntityTypes.HAND,
+                [
+                    Hand(
+                        f"player {h}",
+                        [Card(c, Decimal("1.111"), played_at) for c in range(cards)],
+                    )
+                    for h in range(hands)
+                ],
+            )
+        ]
+    )
+
+
+def main() -> None:
+    instruction = make_instruction(hands=1000, cards=5)
+    assert json.loads(legacy_response(instruction).content) == json.loads(
+        InstructionResponse(instruction).content
+    )
+
+    number = 5
+    legacy = timeit.timeit(lambda: legacy_response(instruction), number=number)
+    single = timeit.timeit(lambda: InstructionResponse(instruction), number=number)
+    print(f"legacy:      {legacy / number * 1000:8.2f} ms per response")
+    print(f"single pass: {single / number * 1000:8.2f} ms per response")
+    print(f"speedup:     {legacy / single:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Compare plain and slotted Contracts when building, loading and encoding a
+large MERGE_APPEND: time, peak memory and number of allocated blocks.
+
+    PYTHONPATH=. python benchmarks/bench_slots.py
+"""
+from dataclasses import dataclass
+import datetime
+from decimal import Decimal
+from enum import Enum
+import gc
+import timeit
+import tracemalloc
+from typing import Callable, Tuple
+
+from slotomania.core import Contract, Instruction, Operation, slotted, to_primitive
+
+
+class EntityTypes(Enum):
+    CARD = 1
+
+
+@dataclass
+class Card(Contract):
+    rank: int
+    width: Decimal
+    played_at: datetime.datetime
+
+
+@slotted
+@dataclass
+class SlottedCard(Contract):
+    rank: int
+    width: Decimal
+    played_at: datetime.datetime
+
+
+ROWS = 50000
+
+
+def allocations(func: Callable) -> Tuple[int, int]:
+    """Peak traced memory and blocks still allocated by what func returns."""
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    snapshot = tracemalloc.take_snapshot()
+    blocks = sum(stat.count for stat in snapshot.statistics("filename"))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return peak, blocks
+
+
+def main() -> None:
+    played_at = datetime.datetime(2000, 1, 1)
+    width = Decimal("1.111")
+    rows = [
+        {"rank": rank, "width": "1.111", "played_at": "2000-01-01T00:00:00"}
+        for rank in range(ROWS)
+    ]
+
+    for card_class in [Card, SlottedCard]:
+
+        def build():
+            return [card_class(rank, width, played_at) for rank in range(ROWS)]
+
+        def load():
+            return [card_class.load_from_dict(row) for row in rows]
+
+        cards = build()
+
+        def encode():
+            operation = Operation.MERGE_APPEND(EntityTypes.CARD, cards)
+            return Instruction([operation]).encode()
+
+        assert to_primitive(load()) == rows
+
+        print(card_class.__name__)
+        for label, func, number in [
+            ("build ", build, 10),
+            ("load  ", load, 2),
+            ("encode", encode, 5),
+        ]:
+            elapsed = timeit.timeit(func, number=number) / number * 1000
+            peak, blocks = allocations(func)
+            print(
+                f"  {label} {elapsed:8.2f} ms, peak {peak / 1024:8.0f} KiB, "
+                f"{blocks:8d} blocks"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -17,11 +17,17 @@ setup(
     description="Slotomania",
     long_description=long_description,
     scripts=["bin/fix_sloto_stubs.py"],
+    entry_points={"console_scripts": ["slotomania=slotomania.cli:main"]},
     url="https://github.com/conanfanli/slotomania",
     packages=find_packages(exclude=["*.tests.*"]),
     install_requires=["yapf>=0.21"],
     python_requires="~=3.6",
-    extras_require={"dev": ["ipython", "mypy"]},
+    extras_require={
+        "dev": ["ipython", "mypy"],
+        "fast": ["orjson"],
+        "msgpack": ["msgpack"],
+        "compression": ["brotli", "zstandard"],
+    },
     classifiers=[
         "Development Status :: 3 - Alpha",
         "License :: OSI Approved :: MIT License",
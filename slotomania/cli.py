@@ -0,0 +1,110 @@
+"""
+Command line entry point, e.g.
+
+    slotomania typescript myapp --output frontend/src/sloto --settings myapp.settings
+"""
+import argparse
+import os
+from typing import List, Optional
+
+from slotomania.codegen import (
+    TypescriptCache,
+    discover,
+    generate_stubs,
+    generate_typescript,
+    watch,
+    write_files,
+)
+
+
+def setup_django(settings: Optional[str]) -> None:
+    if settings:
+        os.environ["DJANGO_SETTINGS_MODULE"] = settings
+
+    if os.environ.get("DJANGO_SETTINGS_MODULE"):
+        import django
+
+        django.setup()
+
+
+def typescript(args: argparse.Namespace) -> None:
+    cache = TypescriptCache(args.cache)
+
+    def generate() -> dict:
+        modules = discover(args.packages, args.exclude)
+        files = generate_typescript(
+            modules,
+            args.output,
+            args.jobs,
+            cache,
+            batch=args.batch,
+            columnar=args.columnar,
+            patch_verbs=args.patch_verbs,
+            msgpack_decoder=args.msgpack_decoder,
+        )
+        if args.stubs:
+            files.update(generate_stubs(modules, args.stubs, args.jobs))
+        return files
+
+    if args.watch:
+        module_names = list(discover(args.packages, args.exclude))
+        watch(module_names, generate)
+    else:
+        for path in write_files(generate()):
+            print(f"Wrote {path}")
+        cache.save()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="slotomania")
+    parser.add_argument("--settings", help="Django settings module")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    parser_typescript = subparsers.add_parser(
+        "typescript",
+        help="Write one typescript module per python module defining contracts, "
+        "enums or InstructorView routes",
+    )
+    parser_typescript.add_argument("packages", nargs="+")
+    parser_typescript.add_argument("--output", "-o", required=True)
+    parser_typescript.add_argument(
+        "--exclude", action="append", default=[], help="fnmatch pattern of modules"
+    )
+    parser_typescript.add_argument(
+        "--jobs", "-j", type=int, default=os.cpu_count() or 1
+    )
+    parser_typescript.add_argument(
+        "--cache", help="json file caching generated blocks between runs"
+    )
+    parser_typescript.add_argument(
+        "--stubs", help="also write .pyi stubs of the contracts to this directory"
+    )
+    parser_typescript.add_argument(
+        "--batch",
+        action="store_true",
+        help="add the creator of the batch endpoint to the modules of views",
+    )
+    parser_typescript.add_argument(
+        "--columnar", action="store_true", help="write expandColumns to slotomania.ts"
+    )
+    parser_typescript.add_argument(
+        "--patch-verbs",
+        action="store_true",
+        help="write applyPatch and mergeByKey to slotomania.ts",
+    )
+    parser_typescript.add_argument(
+        "--msgpack-decoder",
+        action="store_true",
+        help="write decodeMsgpack to slotomania.ts",
+    )
+    parser_typescript.add_argument("--watch", action="store_true")
+    parser_typescript.set_defaults(func=typescript)
+
+    args = parser.parse_args(argv)
+    setup_django(args.settings)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
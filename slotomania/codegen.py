@@ -0,0 +1,448 @@
+"""
+Discover contracts in packages and write generated code to disk incrementally.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import is_dataclass
+from enum import Enum
+from fnmatch import fnmatch
+import importlib
+from itertools import repeat
+import json
+import os
+import pkgutil
+import posixpath
+import sys
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    MutableMapping,
+    Optional,
+    Set,
+    Tuple,
+)
+from typing import ForwardRef  # type: ignore
+
+from slotomania.core import (
+    Contract,
+    InstructorView,
+    ReduxAction,
+    contracts_to_typescript,
+    resolve_field_types,
+)
+from slotomania.stubs import PACKAGE_STUB, module_to_stub, stub_path
+
+
+class TypescriptCache(dict):
+    """Typescript blocks keyed by typescript_fingerprint, persisted as json.
+
+    Pass it as the cache of contracts_to_typescript so unchanged contracts are
+    not generated again, then save it for the next run.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        super().__init__()
+        self.path = path
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.update(json.load(f))
+
+    def save(self) -> None:
+        if self.path:
+            write_if_changed(self.path, json.dumps(self, indent=1, sort_keys=True))
+
+
+def write_if_changed(path: str, content: str) -> bool:
+    """Write content to path unless the file already holds it.
+
+    Leaving unchanged files alone keeps their mtime, so file watchers of the
+    frontend build are not triggered. Returns True if the file was written.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            if f.read() == content:
+                return False
+    except FileNotFoundError:
+        pass
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return True
+
+
+def write_files(files: Dict[str, str]) -> List[str]:
+    """write_if_changed every path: content of files, return the paths written.
+
+    Missing directories are created.
+    """
+    written = []
+    for path, content in files.items():
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if write_if_changed(path, content):
+            written.append(path)
+    return written
+
+
+def module_mtimes(module_names: Iterable[str]) -> Dict[str, float]:
+    mtimes = {}
+    for name in module_names:
+        path = getattr(sys.modules.get(name), "__file__", None)
+        if path and os.path.exists(path):
+            mtimes[name] = os.stat(path).st_mtime
+    return mtimes
+
+
+def reload_changed_modules(mtimes: Dict[str, float]) -> List[str]:
+    """Reload the modules whose file changed since mtimes was taken.
+
+    mtimes is updated in place. Returns the names of the reloaded modules.
+    """
+    current = module_mtimes(mtimes)
+    changed = [name for name, mtime in current.items() if mtimes[name] != mtime]
+    for name in changed:
+        importlib.reload(sys.modules[name])
+    mtimes.update(current)
+    return changed
+
+
+def watch(
+    module_names: List[str],
+    generate: Callable[[], Dict[str, str]],
+    interval: float = 1.0,
+) -> None:
+    """Regenerate code whenever one of the modules changes.
+
+    generate returns {path: content} of the files to write, it should look up
+    contracts through their modules so reloaded classes are used. Thanks to the
+    TypescriptCache only the contracts that changed are generated again.
+    """
+    for name in module_names:
+        importlib.import_module(name)
+
+    mtimes = module_mtimes(module_names)
+    write_files(generate())
+    while True:
+        time.sleep(interval)
+        if reload_changed_modules(mtimes):
+            for path in write_files(generate()):
+                print(f"Wrote {path}")
+
+
+class ModuleDefinitions:
+    """Contracts, enums and routes defined by one python module."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.definitions: List[type] = []
+        self.redux_actions: List[ReduxAction] = []
+        # InstructorView.batch_endpoint of the views of the module
+        self.batch_endpoint = ""
+
+    def __bool__(self) -> bool:
+        return bool(self.definitions or self.redux_actions)
+
+
+def collect_definitions(module: Any) -> ModuleDefinitions:
+    collected = ModuleDefinitions(module.__name__)
+    redux_actions: Dict[str, ReduxAction] = {}
+    for obj in list(vars(module).values()):
+        if not isinstance(obj, type) or obj.__module__ != module.__name__:
+            continue
+
+        if is_dataclass(obj) and issubclass(obj, Contract):
+            collected.definitions.append(obj)
+        elif issubclass(obj, Enum):
+            collected.definitions.append(obj)
+        elif issubclass(obj, InstructorView):
+            # Views of a module may share routes
+            for endpoint, route in obj.dispatch_table.items():
+                if endpoint not in redux_actions:
+                    redux_actions[endpoint] = route.redux_action(endpoint)
+            if obj.dispatch_table and not collected.batch_endpoint:
+                collected.batch_endpoint = obj.batch_endpoint
+
+    collected.redux_actions = list(redux_actions.values())
+    return collected
+
+
+def iter_module_names(packages: Iterable[str], exclude: Iterable[str] = ()):
+    """Names of packages and all their submodules, except those matching one of
+    the fnmatch patterns in exclude."""
+    exclude = list(exclude)
+    for package_name in packages:
+        package = importlib.import_module(package_name)
+        names = [package_name]
+        if hasattr(package, "__path__"):
+            names += [
+                info.name
+                for info in pkgutil.walk_packages(package.__path__, f"{package_name}.")
+            ]
+        for name in names:
+            if not any(fnmatch(name, pattern) for pattern in exclude):
+                yield name
+
+
+def discover(
+    packages: Iterable[str], exclude: Iterable[str] = ()
+) -> Dict[str, ModuleDefinitions]:
+    """Import packages and collect the definitions of every module in them.
+
+    Modules outside packages defining contracts or enums used by the
+    discovered modules are collected too, so every generated file can import
+    what it uses.
+    """
+    discovered = {}
+    for name in iter_module_names(packages, exclude):
+        collected = collect_definitions(importlib.import_module(name))
+        if collected:
+            discovered[name] = collected
+
+    pending = list(discovered.values())
+    while pending:
+        for referenced in iter_referenced_types(pending.pop()):
+            if isinstance(referenced, str) or referenced.__module__ in discovered:
+                continue
+            collected = collect_definitions(sys.modules[referenced.__module__])
+            discovered[collected.name] = collected
+            pending.append(collected)
+    return discovered
+
+
+def build_index(modules: Iterable[ModuleDefinitions]) -> Dict[str, str]:
+    """Map the name of each definition to its module, to resolve ForwardRefs."""
+    return {
+        definition.__name__: module.name
+        for module in modules
+        for definition in module.definitions
+    }
+
+
+def referenced_types(python_type: Any) -> Iterator[Any]:
+    """Classes, or names of forward references, used by python_type."""
+    if isinstance(python_type, ForwardRef):
+        yield python_type.__forward_arg__
+    elif isinstance(python_type, str):
+        yield python_type
+    elif isinstance(python_type, type) and (
+        is_dataclass(python_type)
+        or (issubclass(python_type, Enum) and python_type is not Enum)
+    ):
+        yield python_type
+    else:
+        for arg in getattr(python_type, "__args__", None) or ():
+            yield from referenced_types(arg)
+
+
+def module_path(module_name: str, extension: str = ".ts") -> str:
+    return module_name.replace(".", "/") + extension
+
+
+def relative_import(from_module: str, to_path: str) -> str:
+    """Import specifier of to_path, without extension, from the file of
+    from_module."""
+    path = posixpath.relpath(to_path, posixpath.dirname(module_path(from_module)))
+    return path if path.startswith(".") else f"./{path}"
+
+
+def iter_referenced_types(module: ModuleDefinitions) -> Iterator[Any]:
+    """Classes, or names of forward references, used by the definitions and
+    redux actions of module."""
+    references: List[Any] = [
+        field_type
+        for definition in module.definitions
+        if issubclass(definition, Contract)
+        for field_type in resolve_field_types(definition).values()
+    ] + [action.contract for action in module.redux_actions]
+    for reference in references:
+        yield from referenced_types(reference)
+
+
+def module_imports(module: ModuleDefinitions, index: Dict[str, str]) -> List[str]:
+    """Typescript imports of the definitions module uses from other modules.
+
+    Raises ValueError for a definition which is not generated, the file would
+    not compile.
+    """
+    known_modules = set(index.values())
+    imports: Dict[str, Set[str]] = {}
+    for referenced in iter_referenced_types(module):
+        if isinstance(referenced, str):
+            name, other_module = referenced, index.get(referenced)
+        else:
+            name, other_module = referenced.__name__, referenced.__module__
+        if other_module not in known_modules:
+            raise ValueError(
+                f"{module.name} uses {name}, which is not defined in a "
+                "discovered module"
+            )
+        if other_module != module.name:
+            imports.setdefault(other_module, set()).add(name)
+
+    lines = []
+    if module.redux_actions:
+        plugins = relative_import(module.name, "plugins")
+        lines.append(f'import * as plugins from "{plugins}"')
+    for other_module, names in sorted(imports.items()):
+        path = relative_import(module.name, module_path(other_module, ""))
+        lines.append(f'import {{ {", ".join(sorted(names))} }} from "{path}"')
+    return lines
+
+
+def module_to_typescript(
+    module: ModuleDefinitions,
+    index: Dict[str, str],
+    cache: Optional[MutableMapping[str, str]] = None,
+    batch: bool = False,
+) -> str:
+    """With batch, modules of views get the creator of their batch endpoint."""
+    blocks = module_imports(module, index) + [
+        contracts_to_typescript(
+            dataclasses=module.definitions,
+            redux_actions=module.redux_actions,
+            import_plugins=False,
+            batch_endpoint=module.batch_endpoint if batch else "",
+            cache=cache,
+        )
+    ]
+    return "\n\n".join(blocks) + "\n"
+
+
+def render_module(
+    kind: str,
+    module: ModuleDefinitions,
+    index: Dict[str, str],
+    cache: Optional[MutableMapping[str, str]] = None,
+    batch: bool = False,
+) -> Tuple[str, str]:
+    """Path and content of the typescript or stub file of module."""
+    if kind == "typescript":
+        content = module_to_typescript(module, index, cache, batch)
+        return module_path(module.name), content
+
+    python_module = sys.modules[module.name]
+    return stub_path(python_module), module_to_stub(python_module, module.definitions)
+
+
+def _render_module(
+    kind: str,
+    module_name: str,
+    index: Dict[str, str],
+    cache: Optional[Dict[str, str]],
+    batch: bool,
+) -> Tuple[str, str, Optional[Dict[str, str]]]:
+    """Worker of generate_files, rediscovers the module in its process.
+
+    Returns the blocks added to its copy of cache, for the parent to keep.
+    """
+    from django.apps import apps
+
+    if not apps.ready and os.environ.get("DJANGO_SETTINGS_MODULE"):
+        import django
+
+        django.setup()
+
+    module = collect_definitions(importlib.import_module(module_name))
+    if cache is None:
+        path, content = render_module(kind, module, index, None, batch)
+        return path, content, None
+    local_cache = dict(cache)
+    path, content = render_module(kind, module, index, local_cache, batch)
+    added = {key: block for key, block in local_cache.items() if key not in cache}
+    return path, content, added
+
+
+def generate_files(
+    kind: str,
+    modules: Dict[str, ModuleDefinitions],
+    output: str,
+    jobs: int = 1,
+    cache: Optional[MutableMapping[str, str]] = None,
+    batch: bool = False,
+) -> Dict[str, str]:
+    """Render the kind ("typescript" or "stub") file of every module, return
+    {path: content}.
+
+    With more than one job, modules are rendered by a process pool. Each
+    worker gets a copy of cache and the blocks it adds are merged back.
+    """
+    index = build_index(modules.values())
+    if jobs > 1 and len(modules) > 1:
+        snapshot = None if cache is None else dict(cache)
+        with ProcessPoolExecutor(jobs) as pool:
+            results = list(
+                pool.map(
+                    _render_module,
+                    repeat(kind),
+                    modules,
+                    repeat(index),
+                    repeat(snapshot),
+                    repeat(batch),
+                )
+            )
+        rendered = []
+        for path, content, added in results:
+            rendered.append((path, content))
+            if added:
+                cache.update(added)  # type: ignore
+    else:
+        rendered = [
+            render_module(kind, module, index, cache, batch)
+            for module in modules.values()
+        ]
+    return {os.path.join(output, path): content for path, content in rendered}
+
+
+# Module of the generated helpers shared by every module, e.g. expandColumns
+HELPERS_MODULE = "slotomania.ts"
+
+
+def generate_typescript(
+    modules: Dict[str, ModuleDefinitions],
+    output: str,
+    jobs: int = 1,
+    cache: Optional[MutableMapping[str, str]] = None,
+    batch: bool = False,
+    columnar: bool = False,
+    patch_verbs: bool = False,
+    msgpack_decoder: bool = False,
+) -> Dict[str, str]:
+    """Generate one typescript file per module, return {path: content}.
+
+    batch adds the creator of the batch endpoint to the modules of views.
+    columnar, patch_verbs and msgpack_decoder add the helpers of
+    contracts_to_typescript to HELPERS_MODULE.
+    """
+    files = generate_files("typescript", modules, output, jobs, cache, batch)
+    if columnar or patch_verbs or msgpack_decoder:
+        helpers = contracts_to_typescript(
+            dataclasses=[],
+            redux_actions=[],
+            import_plugins=False,
+            columnar=columnar,
+            patch_verbs=patch_verbs,
+            msgpack_decoder=msgpack_decoder,
+        )
+        files[os.path.join(output, HELPERS_MODULE)] = helpers + "\n"
+    return files
+
+
+def generate_stubs(
+    modules: Dict[str, ModuleDefinitions], output: str, jobs: int = 1
+) -> Dict[str, str]:
+    """Generate one .pyi stub per module, return {path: content}.
+
+    Parent packages without a stub get a permissive one so type checkers find
+    the generated stubs.
+    """
+    stubs = generate_files("stub", modules, output, jobs)
+    for name in modules:
+        parts = name.split(".")
+        for depth in range(1, len(parts)):
+            path = os.path.join(output, *parts[:depth], "__init__.pyi")
+            if path not in stubs and not os.path.exists(path):
+                stubs[path] = PACKAGE_STUB
+    return stubs
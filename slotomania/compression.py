@@ -0,0 +1,131 @@
+"""
+Compression of InstructorView responses, negotiated with Accept-Encoding.
+
+gzip is always available, zstd and br when the zstandard and brotli packages
+are installed. Streamed responses are compressed chunk by chunk.
+"""
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import zlib
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+# Level used for each content encoding unless the resolver sets another
+DEFAULT_LEVELS = {"zstd": 3, "br": 5, "gzip": 6}
+
+# Streamed bytes compressed and flushed at once
+STREAM_FLUSH_SIZE = 16 * 1024
+
+
+def available_encodings() -> List[str]:
+    """Installed content encodings, preferred first."""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+def parse_quality_values(header: str) -> Dict[str, float]:
+    """Quality of each value of an Accept or Accept-Encoding header, in the
+    order they are listed."""
+    accepted: Dict[str, float] = {}
+    for part in header.split(","):
+        name, *parameters = part.split(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for parameter in parameters:
+            parameter = parameter.strip()
+            if parameter.startswith("q="):
+                try:
+                    quality = float(parameter[2:])
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+    return accepted
+
+
+def negotiate_encoding(
+    request: Any, encodings: Optional[Iterable[str]] = None
+) -> Optional[str]:
+    """First of encodings accepted by the Accept-Encoding header of request."""
+    header = request.META.get("HTTP_ACCEPT_ENCODING")
+    if not header:
+        return None
+
+    accepted = parse_quality_values(header)
+    for encoding in encodings or available_encodings():
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def get_level(encoding: str, levels: Dict[str, int]) -> int:
+    return levels.get(encoding, DEFAULT_LEVELS[encoding])
+
+
+def compress(content: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(content)
+    elif encoding == "br":
+        return brotli.compress(content, quality=level)
+
+    assert encoding == "gzip", f"Unknown encoding {encoding}"
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(content) + compressor.flush()
+
+
+def iter_batches(chunks: Iterable[bytes], size: int) -> Iterator[bytes]:
+    """Join consecutive chunks into batches of at least size bytes, but the
+    last one."""
+    batch: List[bytes] = []
+    length = 0
+    for chunk in chunks:
+        batch.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield b"".join(batch)
+            batch, length = [], 0
+    if batch:
+        yield b"".join(batch)
+
+
+def iter_compress(
+    chunks: Iterable[bytes],
+    encoding: str,
+    level: int,
+    flush_size: int = STREAM_FLUSH_SIZE,
+) -> Iterator[bytes]:
+    """Compress a stream, flushing every flush_size bytes so the client
+    receives the data as it is encoded. Flushing each of the small chunks of
+    Instruction.iter_encode would defeat the compression."""
+    chunks = iter_batches(chunks, flush_size)
+    if encoding == "zstd":
+        compressobj = zstandard.ZstdCompressor(level=level).compressobj()
+        for chunk in chunks:
+            yield compressobj.compress(chunk) + compressobj.flush(
+                zstandard.COMPRESSOBJ_FLUSH_BLOCK
+            )
+        yield compressobj.flush()
+    elif encoding == "br":
+        compressor = brotli.Compressor(quality=level)
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+    else:
+        assert encoding == "gzip", f"Unknown encoding {encoding}"
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
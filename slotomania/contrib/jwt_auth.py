@@ -1,9 +1,15 @@
+from collections import OrderedDict
 import datetime
-from typing import Any, ClassVar, Mapping
+import hashlib
+import threading
+import time
+from typing import Any, ClassVar, Dict, List, Mapping, Optional, Tuple
 import uuid
 
 from django.conf import settings
 from django.contrib.auth import authenticate, get_user_model, login
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.db.models.signals import post_delete, post_save
 import jwt
 
 from slotomania.contrib.contracts import AuthenticateUserRequest
@@ -11,6 +17,184 @@ from slotomania.core import EntityTypes, Instruction, Operation, RequestResolver
 from slotomania.exceptions import NotAuthenticated
 
 
+# Database alias and concrete field values of a user
+UserSnapshot = Tuple[str, tuple]
+
+# Fields never copied into the token caches, they are deferred on the users
+# built from a snapshot and loaded from the database if accessed
+SNAPSHOT_EXCLUDED_FIELDS = frozenset(["password"])
+
+
+def snapshot_attnames(model: Any) -> List[str]:
+    return [
+        field.attname
+        for field in model._meta.concrete_fields
+        if field.name not in SNAPSHOT_EXCLUDED_FIELDS
+    ]
+
+
+def user_snapshot(user: Any) -> UserSnapshot:
+    """What the token caches store instead of the user instance."""
+    values = tuple(getattr(user, name) for name in snapshot_attnames(type(user)))
+    return user._state.db, values
+
+
+def user_from_snapshot(snapshot: UserSnapshot) -> Any:
+    """A new user instance, without querying the database."""
+    db, values = snapshot
+    User = get_user_model()
+    return User.from_db(db, snapshot_attnames(User), values)
+
+
+class LocalTokenCache:
+    """Bounded in-process LRU cache of verified tokens."""
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        # token -> (expires_at, payload, username, snapshot)
+        self._entries: "OrderedDict[str, Tuple[float, Mapping[str, Any], str, Any]]"
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[Tuple[Mapping[str, Any], Any]]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+
+            expires_at, payload, _, snapshot = entry
+            if expires_at <= time.time():
+                del self._entries[token]
+                return None
+
+            self._entries.move_to_end(token)
+
+        # Every request gets its own user instance
+        return payload, user_from_snapshot(snapshot)
+
+    def set(
+        self, token: str, payload: Mapping[str, Any], user: Any, expires_at: float
+    ) -> None:
+        entry = (expires_at, payload, user.get_username(), user_snapshot(user))
+        with self._lock:
+            self._entries[token] = entry
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, username: str) -> None:
+        with self._lock:
+            for token, (_, _, cached_username, _) in list(self._entries.items()):
+                if cached_username == username:
+                    del self._entries[token]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class DjangoTokenCache:
+    """Cache of verified tokens stored in a Django cache, shared by processes.
+
+    Each user has a version, stored with its tokens and checked when they are
+    read. invalidate_user gives the user a new version, like
+    response_cache.invalidate_tags, so no list of tokens has to be updated.
+    """
+
+    def __init__(
+        self, alias: str = DEFAULT_CACHE_ALIAS, prefix: str = "slotomania:jwt:"
+    ) -> None:
+        self.alias = alias
+        self.prefix = prefix
+
+    def _key(self, kind: str, value: str) -> str:
+        digest = hashlib.sha256(value.encode("utf-8")).hexdigest()
+        return f"{self.prefix}{kind}:{digest}"
+
+    def get(self, token: str) -> Optional[Tuple[Mapping[str, Any], Any]]:
+        cache = caches[self.alias]
+        entry = cache.get(self._key("token", token))
+        if entry is None:
+            return None
+
+        payload, username, version, snapshot = entry
+        if cache.get(self._key("user", username)) != version:
+            return None
+        return payload, user_from_snapshot(snapshot)
+
+    def set(
+        self, token: str, payload: Mapping[str, Any], user: Any, expires_at: float
+    ) -> None:
+        timeout = expires_at - time.time()
+        if timeout <= 0:
+            return
+
+        cache = caches[self.alias]
+        username = user.get_username()
+        user_key = self._key("user", username)
+        version = cache.get(user_key)
+        if version is None:
+            version = uuid.uuid4().hex
+            # Versions must outlive the tokens using them
+            if not cache.add(user_key, version, None):
+                version = cache.get(user_key)
+        entry = (payload, username, version, user_snapshot(user))
+        cache.set(self._key("token", token), entry, timeout)
+
+    def invalidate_user(self, username: str) -> None:
+        caches[self.alias].set(self._key("user", username), uuid.uuid4().hex, None)
+
+
+_token_caches: Dict[str, Any] = {}
+
+
+def get_token_cache() -> Any:
+    """Return the cache of verified tokens configured by JWT_TOKEN_CACHE.
+
+    JWT_TOKEN_CACHE is None (no caching), "local", "django" or an object
+    implementing get, set and invalidate_user like LocalTokenCache.
+    """
+    backend = getattr(settings, "JWT_TOKEN_CACHE", None)
+    if backend is None or not isinstance(backend, str):
+        return backend
+
+    if backend not in _token_caches:
+        if backend == "local":
+            _token_caches[backend] = LocalTokenCache(
+                getattr(settings, "JWT_TOKEN_CACHE_SIZE", 1024)
+            )
+        elif backend == "django":
+            _token_caches[backend] = DjangoTokenCache()
+        else:
+            raise ValueError(f"Unknown JWT_TOKEN_CACHE: {backend}")
+
+    return _token_caches[backend]
+
+
+def invalidate_cached_tokens(user) -> None:
+    """Forget every cached token of user, e.g. after deactivating it."""
+    cache = get_token_cache()
+    if cache is not None:
+        cache.invalidate_user(user.get_username())
+
+
+def invalidate_changed_user(sender, instance, **kwargs) -> None:
+    if kwargs.get("signal") is post_delete or not instance.is_active:
+        invalidate_cached_tokens(instance)
+
+
+post_save.connect(
+    invalidate_changed_user,
+    sender=settings.AUTH_USER_MODEL,
+    dispatch_uid="slotomania_invalidate_saved_user",
+)
+post_delete.connect(
+    invalidate_changed_user,
+    sender=settings.AUTH_USER_MODEL,
+    dispatch_uid="slotomania_invalidate_deleted_user",
+)
+
+
 def authenticate_request(request) -> None:
     header = request.META.get("HTTP_AUTHORIZATION")
     try:
@@ -21,6 +205,12 @@ def authenticate_request(request) -> None:
     if not token:
         raise NotAuthenticated()
 
+    cache = get_token_cache()
+    cached = cache is not None and cache.get(token)
+    if cached:
+        request.jwt_payload, request.user = cached
+        return
+
     try:
         payload = jwt_decode_handler(token)
     except jwt.ExpiredSignature as e:
@@ -31,6 +221,12 @@ def authenticate_request(request) -> None:
         raise NotAuthenticated(str(e))
 
     user = authenticate_credentials(payload)
+    if cache is not None:
+        # Cached tokens expire with the token or after JWT_TOKEN_CACHE_TTL
+        expires_at = time.time() + getattr(settings, "JWT_TOKEN_CACHE_TTL", 300)
+        cache.set(token, payload, user, min(payload.get("exp", expires_at), expires_at))
+
+    request.jwt_payload = payload
     request.user = user
 
 
@@ -1,21 +1,81 @@
-from dataclasses import MISSING, Field, asdict, dataclass, is_dataclass
+from contextlib import contextmanager
+from dataclasses import MISSING, Field, asdict, dataclass, fields, is_dataclass
 import datetime
-import decimal
 from decimal import Decimal
 from enum import Enum, auto
+import hashlib
+import inspect
+from itertools import islice
 import json
-from typing import Any, Callable, ClassVar, Dict, List, Type, TypeVar, Union
+from operator import attrgetter, methodcaller
+import re
+from types import MappingProxyType
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    MutableMapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    get_type_hints,
+)
 from typing import ForwardRef  # type: ignore
+import uuid
 
+from django.core.cache import DEFAULT_CACHE_ALIAS
 from django.db import transaction
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.http import JsonResponse as DjangoJsonResponse
+from django.utils import dateparse
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import cached_property
 from django.views import View
 
-from slotomania.exceptions import BadResolver, MissingField, UnknowFieldType
+from slotomania.compression import (
+    compress,
+    get_level,
+    iter_compress,
+    negotiate_encoding,
+    parse_quality_values,
+)
+from slotomania.exceptions import BadResolver, UnknowFieldType, ValidationError
+from slotomania.instrumentation import NULL_METRICS, RequestMetrics
+from slotomania.response_cache import (
+    CachedResponse,
+    get_cached_response,
+    is_not_modified,
+    response_cache_key,
+    set_cached_response,
+)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
 
 T = TypeVar("T", bound="Contract")
 
+# Decoder for request bodies, orjson if installed
+loads_json: Callable[[Union[bytes, str]], Any] = orjson.loads if orjson else json.loads
+
+# Number of items encoded at once when streaming an iterator target_value
+STREAM_CHUNK_SIZE = 500
+
 
 class Undefined:
     pass
@@ -27,30 +87,424 @@ class JsonResponse(DjangoJsonResponse):
         super().__init__(data, *args, **kwargs)
 
 
+class EncodedJsonResponse(HttpResponse):
+    """Response for an already encoded json body."""
+
+    def __init__(self, content: bytes, *args, **kwargs) -> None:
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(content, *args, **kwargs)
+
+    @cached_property
+    def data(self) -> Any:
+        return json.loads(self.content)
+
+
+class InstructionResponse(EncodedJsonResponse):
+    """Response whose body is encoded straight from an Instruction."""
+
+    def __init__(self, instruction: "Instruction", *args, **kwargs) -> None:
+        super().__init__(instruction.encode(), *args, **kwargs)
+
+
 class InstructorView(View):
     permission_classes: list = []
     routes: Dict[str, Type["RequestResolver"]]
+    # Route of each endpoint, built from routes when the class is created
+    dispatch_table: Mapping[str, "Route"] = MappingProxyType({})
+    # Endpoint accepting a list of {"endpoint": ..., "body": ...} items
+    batch_endpoint: str = "batch"
+    # Run all items of a batch in one transaction instead of running each item
+    # according to the transaction_policy of its resolver
+    batch_atomic: bool = True
+    # Sinks recording the metrics of each request, see slotomania.instrumentation
+    instrumentation_sinks: list = []
+    # Compression of batch responses, resolvers set their own
+    compression_threshold: Optional[int] = 1024
+    compression_levels: Dict[str, int] = {}
 
-    def get(self, request: Any, endpoint: str = None) -> JsonResponse:
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if "routes" in cls.__dict__:
+            cls.build_dispatch_table()
+
+    @classmethod
+    def build_dispatch_table(cls) -> None:
+        """Build dispatch_table, call it again after changing routes."""
+        cls.dispatch_table = MappingProxyType(
+            {endpoint: get_route(resolver) for endpoint, resolver in cls.routes.items()}
+        )
+
+    def get(self, request: Any, endpoint: Optional[str] = None) -> JsonResponse:
         return JsonResponse({})
 
-    def post(self, request: Any, endpoint: str, *args, **kwargs) -> JsonResponse:
-        """If mustate_state returns HttpResponse, return it."""
-        with transaction.atomic():
-            request.data = json.loads(request.body)
-            resolver = self.routes[endpoint](request=request, data=request.data)
+    def unknown_endpoint(self, endpoints: List[str]) -> JsonResponse:
+        return JsonResponse(
+            {"error": "unknown_endpoint", "endpoints": endpoints}, status=404
+        )
+
+    def invalid_batch(self, message: str) -> JsonResponse:
+        return JsonResponse({"error": "invalid_batch", "message": message}, status=400)
+
+    def start_metrics(self, request: Any, endpoint: str) -> Any:
+        if not self.instrumentation_sinks:
+            return NULL_METRICS
+        return RequestMetrics(endpoint, len(request.body))
+
+    def post(self, request: Any, endpoint: str, *args, **kwargs) -> HttpResponse:
+        """If mustate_state returns HttpResponse, return it.
+
+        The request is authenticated before its body is decoded. Only resolve
+        runs in the transaction and the response is encoded after it ends.
+        """
+        if endpoint == self.batch_endpoint:
+            return self.post_batch(request)
+        route = self.dispatch_table.get(endpoint)
+        if route is None:
+            return self.unknown_endpoint([endpoint])
+
+        metrics = self.start_metrics(request, endpoint)
+        with metrics.count_queries():
+            resolver = route.resolver(request=request, body=request.body)
+            resolver.metrics = metrics
+            with metrics.phase("authenticate"):
+                resolver.authenticate()
+            with metrics.phase("parse"):
+                request.data = resolver.raw_data
+            with metrics.phase("validate"):
+                resolver.validate_data()
+            if resolver.cache_timeout is None:
+                http_response = self.resolve_response(resolver)
+            else:
+                http_response = self.cached_response(endpoint, resolver)
+            http_response = self.compress_response(
+                http_response,
+                resolver.compression_threshold,
+                resolver.compression_levels,
+                metrics,
+            )
+
+        metrics.finish(http_response, self.instrumentation_sinks)
+        return http_response
+
+    def resolve_response(self, resolver: "RequestResolver") -> HttpResponse:
+        metrics = resolver.metrics
+        with metrics.phase("transaction"), resolver.transaction_context():
+            with metrics.phase("resolve"):
+                response = resolver.run_resolve()
+        with metrics.phase("serialize"):
+            return self.make_response(response)
+
+    def cached_response(
+        self, endpoint: str, resolver: "RequestResolver"
+    ) -> HttpResponse:
+        """Serve the response of resolver from the response cache.
+
+        Responses carry an ETag. When it matches If-None-Match a 304 is
+        returned, a cache hit then skips decoding the cached body.
+        """
+        key, cached = self.get_cached_response(endpoint, resolver)
+        http_response: Optional[HttpResponse] = None
+        if cached is None:
+            http_response = self.resolve_response(resolver)
+            cached = self.set_cached_response(key, resolver, http_response)
+            if cached is None:
+                return http_response
+
+        return self.conditional_response(resolver, cached, http_response)
+
+    def get_cached_response(
+        self, endpoint: str, resolver: "RequestResolver"
+    ) -> Tuple[str, Optional[CachedResponse]]:
+        """Cache key of the response of resolver and the response cached under
+        it, if any."""
+        with resolver.metrics.phase("cache"):
+            key = response_cache_key(
+                endpoint,
+                resolver.canonical_data(),
+                resolver.cache_user(),
+                resolver.get_cache_tags(),
+                self.response_codec().content_type,
+                resolver.cache_alias,
+            )
+            return key, get_cached_response(key, resolver.cache_alias)
+
+    def set_cached_response(
+        self, key: str, resolver: "RequestResolver", http_response: HttpResponse
+    ) -> Optional[CachedResponse]:
+        """Cache http_response, unless it is an error or streamed."""
+        if http_response.status_code != 200 or http_response.streaming:
+            return None
+
+        timeout = resolver.cache_timeout
+        assert timeout is not None, f"{resolver} is not cached"
+        cached = CachedResponse(http_response.content, http_response["Content-Type"])
+        with resolver.metrics.phase("cache"):
+            set_cached_response(key, cached, timeout, resolver.cache_alias)
+        return cached
+
+    def conditional_response(
+        self,
+        resolver: "RequestResolver",
+        cached: CachedResponse,
+        http_response: Optional[HttpResponse],
+    ) -> HttpResponse:
+        """http_response, or cached when it is None, with its ETag. A 304 if
+        the ETag matches If-None-Match."""
+        if is_not_modified(resolver.request, cached.etag):
+            http_response = HttpResponse(status=304)
+        elif http_response is None:
+            http_response = EncodedJsonResponse(
+                cached.content, content_type=cached.content_type
+            )
+        http_response["ETag"] = cached.etag
+        patch_vary_headers(http_response, ("Accept",))
+        return http_response
+
+    def response_codec(self) -> "Codec":
+        """Codec of the response body, negotiated with the Accept header."""
+        return response_codec(self.request)
+
+    def make_response(self, response: Any) -> HttpResponse:
+        if isinstance(response, HttpResponse):
+            return response
+        if isinstance(response, Instruction) and response.is_streaming:
+            # The iterators are consumed after the transaction has ended. Only
+            # json is streamed, a msgpack array starts with its length.
+            return StreamingHttpResponse(
+                response.iter_encode(), content_type="application/json"
+            )
 
-            resolver.authenticate()
-            response = resolver.resolve()
+        codec = self.response_codec()
+        if codec is not JSON_CODEC:
+            return self.encoded_response(self.encode_result(response, codec), codec)
+        elif isinstance(response, dict):
+            http_response = JsonResponse(response)
+        elif isinstance(response, Instruction):
+            http_response = InstructionResponse(response)
+        elif hasattr(response, "serialize"):
+            http_response = JsonResponse(response.serialize())
+        else:
+            raise AssertionError("Unknow type: {}".format(type(response)))
+        patch_vary_headers(http_response, ("Accept",))
+        return http_response
 
-            if isinstance(response, HttpResponse):
+    def encoded_response(self, content: bytes, codec: "Codec") -> HttpResponse:
+        if codec is JSON_CODEC:
+            http_response = EncodedJsonResponse(content)
+        else:
+            http_response = HttpResponse(content, content_type=codec.content_type)
+        # The codec was negotiated with the Accept header
+        patch_vary_headers(http_response, ("Accept",))
+        return http_response
+
+    def compress_response(
+        self,
+        response: HttpResponse,
+        threshold: Optional[int],
+        levels: Dict[str, int],
+        metrics: Any,
+    ) -> HttpResponse:
+        """Compress response with the best encoding the client accepts.
+
+        Bodies smaller than threshold are sent as they are, a threshold of None
+        disables compression. Streamed bodies are compressed chunk by chunk
+        whatever their size.
+        """
+        if (
+            threshold is None
+            or response.status_code != 200
+            or response.has_header("Content-Encoding")
+        ):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = negotiate_encoding(self.request)
+        if encoding is None:
+            return response
+
+        level = get_level(encoding, levels)
+        if response.streaming:
+            response.streaming_content = iter_compress(
+                response.streaming_content, encoding, level
+            )
+        else:
+            content = response.content
+            if len(content) < threshold:
                 return response
-            elif isinstance(response, dict):
-                return JsonResponse(response)
-            elif hasattr(response, "serialize"):
-                return JsonResponse(response.serialize())
+            with metrics.phase("compress"):
+                compressed = compress(content, encoding, level)
+            if len(compressed) >= len(content):
+                return response
+            if metrics.enabled:
+                metrics.bytes_saved = len(content) - len(compressed)
+            response.content = compressed
+            response["Content-Length"] = str(len(compressed))
+
+        response["Content-Encoding"] = encoding
+        etag = response.get("ETag")
+        if etag and not etag.startswith("W/"):
+            # The encoded body differs from the one the ETag was computed from
+            response["ETag"] = f"W/{etag}"
+        return response
+
+    def post_batch(self, request: Any) -> HttpResponse:
+        """Resolve several endpoints in one request.
+
+        Authentication happens once for the whole batch. The response is an
+        array holding the result of each item.
+        """
+        metrics = self.start_metrics(request, self.batch_endpoint)
+        with metrics.count_queries():
+            with metrics.phase("parse"):
+                request.data = request_codec(request).loads(request.body)
+            if not isinstance(request.data, list):
+                return self.invalid_batch("expected a list of items")
+            for index, item in enumerate(request.data):
+                if not isinstance(item, dict) or not isinstance(
+                    item.get("endpoint"), str
+                ):
+                    return self.invalid_batch(f"item {index} has no endpoint")
+                if not isinstance(item.get("body", {}), dict):
+                    return self.invalid_batch(f"item {index} has no object body")
+            unknown = [
+                item["endpoint"]
+                for item in request.data
+                if item["endpoint"] not in self.dispatch_table
+            ]
+            if unknown:
+                return self.unknown_endpoint(unknown)
+            for index, item in enumerate(request.data):
+                if returns_http_response(self.dispatch_table[item["endpoint"]]):
+                    return self.invalid_batch(
+                        f"item {index} returns an HttpResponse, it cannot be batched"
+                    )
+
+            def resolve_item(item: dict) -> Any:
+                resolver = self.dispatch_table[item["endpoint"]].resolver(
+                    request=request, data=item.get("body", {})
+                )
+                resolver.metrics = metrics
+                with metrics.phase("authenticate"):
+                    resolver.authenticate()
+                with metrics.phase("validate"):
+                    resolver.validate_data()
+                if self.batch_atomic:
+                    with metrics.phase("resolve"):
+                        return resolver.run_resolve()
+
+                with metrics.phase("transaction"), resolver.transaction_context():
+                    with metrics.phase("resolve"):
+                        return resolver.run_resolve()
+
+            if self.batch_atomic:
+                with metrics.phase("transaction"), transaction.atomic():
+                    responses = [resolve_item(item) for item in request.data]
             else:
-                raise AssertionError("Unknow type: {}".format(type(response)))
+                responses = [resolve_item(item) for item in request.data]
+
+            with metrics.phase("serialize"):
+                codec = self.response_codec()
+                results = [
+                    self.encode_result(response, codec) for response in responses
+                ]
+                http_response = self.encoded_response(codec.array(results), codec)
+            http_response = self.compress_response(
+                http_response,
+                self.compression_threshold,
+                self.compression_levels,
+                metrics,
+            )
+
+        metrics.finish(http_response, self.instrumentation_sinks)
+        return http_response
+
+    def encode_result(self, response: Any, codec: Optional["Codec"] = None) -> bytes:
+        codec = codec or JSON_CODEC
+        if isinstance(response, HttpResponse):
+            # HttpResponse has a serialize method too, which returns its headers
+            raise AssertionError("Cannot encode an HttpResponse")
+        elif isinstance(response, (Instruction, dict)):
+            return codec.dumps(response)
+        elif hasattr(response, "serialize"):
+            return codec.dumps(response.serialize())
+        else:
+            raise AssertionError("Cannot encode type: {}".format(type(response)))
+
+
+class AsyncInstructorView(InstructorView):
+    """InstructorView for ASGI deployments.
+
+    Async resolvers whose transaction_policy is NONE are awaited on the event
+    loop, database work has to be wrapped with sync_to_async by the resolver
+    itself. Other resolvers and batches are handled exactly like
+    InstructorView, in a worker thread, an async resolve then runs inside its
+    transaction.
+    """
+
+    async def get(  # type: ignore
+        self, request: Any, endpoint: Optional[str] = None
+    ) -> JsonResponse:
+        return JsonResponse({})
+
+    async def post(self, request: Any, endpoint: str, *args, **kwargs) -> HttpResponse:
+        from asgiref.sync import sync_to_async
+
+        route = self.dispatch_table.get(endpoint)
+        if (
+            route is None
+            or not route.is_async
+            or route.resolver.transaction_policy is not TransactionPolicy.NONE
+        ):
+            # A transaction cannot span awaits on the event loop
+            return await sync_to_async(super().post)(request, endpoint, *args, **kwargs)
+
+        metrics = self.start_metrics(request, endpoint)
+        resolver = route.resolver(request=request, body=request.body)
+        resolver.metrics = metrics
+        with metrics.phase("authenticate"):
+            await sync_to_async(resolver.authenticate)()
+        with metrics.phase("parse"):
+            request.data = resolver.raw_data
+        with metrics.phase("validate"):
+            resolver.validate_data()
+        if resolver.cache_timeout is None:
+            http_response = await self.resolve_response_async(resolver)
+        else:
+            http_response = await self.cached_response_async(endpoint, resolver)
+        http_response = self.compress_response(
+            http_response,
+            resolver.compression_threshold,
+            resolver.compression_levels,
+            metrics,
+        )
+
+        metrics.finish(http_response, self.instrumentation_sinks)
+        return http_response
+
+    async def resolve_response_async(self, resolver: "RequestResolver") -> HttpResponse:
+        metrics = resolver.metrics
+        with metrics.phase("resolve"):
+            response = await resolver.resolve()
+        with metrics.phase("serialize"):
+            return self.make_response(response)
+
+    async def cached_response_async(
+        self, endpoint: str, resolver: "RequestResolver"
+    ) -> HttpResponse:
+        """InstructorView.cached_response for async resolvers."""
+        from asgiref.sync import sync_to_async
+
+        key, cached = await sync_to_async(self.get_cached_response)(endpoint, resolver)
+        http_response: Optional[HttpResponse] = None
+        if cached is None:
+            http_response = await self.resolve_response_async(resolver)
+            cached = await sync_to_async(self.set_cached_response)(
+                key, resolver, http_response
+            )
+            if cached is None:
+                return http_response
+
+        return self.conditional_response(resolver, cached, http_response)
 
 
 class Verbs(Enum):
@@ -58,6 +512,10 @@ class Verbs(Enum):
     MERGE_APPEND = auto()
     MERGE_PREPEND = auto()
     OVERWRITE = auto()
+    # Apply JSON patch style operations to the entity, see diff_contracts
+    PATCH = auto()
+    # Upsert items into the entity, matching them on a key field
+    MERGE_BY_KEY = auto()
 
 
 def is_subclass(obj, cls):
@@ -69,6 +527,9 @@ def is_subclass(obj, cls):
 
 @dataclass
 class Contract:
+    # Lets subclasses decorated with slotted drop their __dict__
+    __slots__ = ()
+
     def asdict(self) -> dict:
         return asdict(self)
 
@@ -89,39 +550,130 @@ class Contract:
         return "export interface {} {{\n{}\n}}".format(cls.__name__, interface_body)
 
     @classmethod
-    def load_from_dict(cls: Type[T], data: dict) -> T:
-        kwargs = {}
-        annotation = cls.__init__.__annotations__
-        PRIMITIVES = list(TYPE_MAP.keys())
-
-        def convert_value(value, value_type):
-            if value_type in PRIMITIVES:
-                return value
-            elif is_subclass(value_type, Enum):
-                return value_type[value if isinstance(value, str) else value.name]
-            elif is_dataclass(value_type):
-                return value_type.load_from_dict(value)
-            elif getattr(value_type, "__origin__", None) == Union:
-                args = getattr(value_type, "__args__")
-                # TODO: natively chose first type in Union
-                return convert_value(value, args[0])
-            elif value_type.__origin__ == list:
-                # e.g. List[OtherSloto]
-                nested_type = value_type.__args__[0]
-                return [convert_value(item, nested_type) for item in value]
-            else:
-                raise Exception(f"not sure what to do with {value_type}: {value}")
+    def validate(
+        cls, data: Any, strict: bool = False, formats: bool = True
+    ) -> List[dict]:
+        """Return the errors of data, see ValidationError.
+
+        In strict mode keys which are not fields are errors too. Without
+        formats, strings of DECODERS types are not parsed, loading does it.
+        """
+        errors: List[dict] = []
+        if isinstance(data, dict):
+            get_validator(cls, formats)(data, "", errors, strict)
+        else:
+            errors.append(type_error("", cls, data))
+        return errors
 
-        for key in data:
-            if key in cls.get_fields():
-                arg_type = annotation[key]
-                kwargs[key] = convert_value(data[key], arg_type)
+    @classmethod
+    def load_from_dict(cls: Type[T], data: dict, strict: bool = False) -> T:
+        return load_validated(cls, get_loader(cls), data, strict)
 
-        for name, field in cls.get_fields().items():
-            if is_field_required(field) and name not in data:
-                raise MissingField(field)
 
-        return cls(**kwargs)  # type: ignore
+def load_validated(
+    cls: Type[T], loader: Callable[[dict], T], data: Any, strict: bool
+) -> T:
+    """Validate data and load it with loader, the loader of cls.
+
+    Formatted strings, e.g. datetimes, are parsed once, by the loader.
+    """
+    errors = cls.validate(data, strict, formats=False)
+    if not errors:
+        try:
+            return loader(data)
+        except (ValueError, ArithmeticError):
+            # Find which string is malformed
+            errors = cls.validate(data, strict)
+            if not errors:
+                raise
+    raise ValidationError.from_errors(errors)
+
+
+def slotted(cls: Type[T]) -> Type[T]:
+    """Rebuild the dataclass cls with __slots__ instead of a __dict__.
+
+    Instances take less memory and are faster to create, e.g. for the items of
+    a large MERGE_APPEND. Apply it above @dataclass:
+
+        @slotted
+        @dataclass
+        class Card(Contract):
+            rank: int
+
+    Instances cannot get attributes which are not fields, and methods of cls
+    cannot use super() without arguments.
+    """
+    field_names = tuple(cls.get_fields())  # type: ignore
+    namespace = {
+        key: value
+        for key, value in cls.__dict__.items()
+        # Defaults of fields live in __init__, compiled loaders refer to cls
+        if key not in field_names
+        and key not in ["__dict__", "__weakref__"]
+        and not key.startswith("_sloto_")
+    }
+    inherited = {
+        name for base in cls.__mro__[1:] for name in base.__dict__.get("__slots__", ())
+    }
+    namespace["__slots__"] = tuple(
+        name for name in field_names if name not in inherited
+    )
+    metaclass: Any = type(cls)
+    return metaclass(cls.__name__, cls.__bases__, namespace)
+
+
+class Columns:
+    """A list of contracts of one class, encoded column by column.
+
+    Field names are sent once instead of once per item:
+
+        {"__columns__": ["rank", ...], "__values__": [[10, 11, ...], ...]}
+
+    expand_columns, or expandColumns of the generated typescript, turns it
+    back into a list of objects. An empty list is encoded as [].
+    """
+
+    __slots__ = ("items",)
+
+    def __init__(self, items: Iterable[Contract]) -> None:
+        # Columns are encoded at once, an iterator is consumed here
+        self.items = items if isinstance(items, list) else list(items)
+
+
+class RawJSON:
+    """An already encoded json value, spliced as is into json responses.
+
+    Use it for values which are the same for many requests, e.g. the
+    target_value or the whole Operation of a lookup table, see
+    slotomania.fragments.cached_fragment. Other codecs encode its decoded
+    value.
+    """
+
+    __slots__ = ("content", "_value")
+
+    def __init__(self, content: Union[bytes, str]) -> None:
+        if isinstance(content, bytes):
+            content = content.decode("utf-8")
+        self.content = content
+        self._value: Any = Undefined
+
+    @classmethod
+    def encode(cls, value: Any) -> "RawJSON":
+        return cls(json.dumps(value, cls=InstructionEncoder))
+
+    @property
+    def value(self) -> Any:
+        if self._value is Undefined:
+            self._value = loads_json(self.content)
+        return self._value
+
+
+def expand_columns(value: Any) -> Any:
+    """Inverse of the encoding of Columns, other values are returned as is."""
+    if not isinstance(value, dict) or "__columns__" not in value:
+        return value
+    names = value["__columns__"]
+    return [dict(zip(names, row)) for row in zip(*value["__values__"])]
 
 
 @dataclass
@@ -131,13 +683,26 @@ class Operation(Contract):
     target_value: Any
 
     @classmethod
-    def MERGE_APPEND(cls, entity_type: Enum, target_value) -> "Operation":
-        assert isinstance(target_value, list), f"'{target_value}' is not a list"
+    def MERGE_APPEND(
+        cls, entity_type: Enum, target_value, columnar: bool = False
+    ) -> "Operation":
+        """columnar encodes a list of contracts of one class as Columns."""
+        assert isinstance(
+            target_value, (list, Iterator)
+        ), f"'{target_value}' is not a list"
+        if columnar:
+            target_value = Columns(target_value)
         return Operation(Verbs.MERGE_APPEND, entity_type, target_value)
 
     @classmethod
-    def MERGE_PREPEND(cls, entity_type: Enum, target_value) -> "Operation":
-        assert isinstance(target_value, list), f"'{target_value}' is not a list"
+    def MERGE_PREPEND(
+        cls, entity_type: Enum, target_value, columnar: bool = False
+    ) -> "Operation":
+        assert isinstance(
+            target_value, (list, Iterator)
+        ), f"'{target_value}' is not a list"
+        if columnar:
+            target_value = Columns(target_value)
         return Operation(Verbs.MERGE_PREPEND, entity_type, target_value)
 
     @classmethod
@@ -148,19 +713,398 @@ class Operation(Contract):
     def OVERWRITE(cls, entity_type: Enum, target_value) -> "Operation":
         return Operation(Verbs.OVERWRITE, entity_type, target_value)
 
+    @classmethod
+    def PATCH(cls, entity_type: Enum, target_value: List[dict]) -> "Operation":
+        """target_value is a list of {"op", "path", "value"} operations, e.g.
+        the result of diff_contracts."""
+        assert isinstance(target_value, list), f"'{target_value}' is not a list"
+        return Operation(Verbs.PATCH, entity_type, target_value)
+
+    @classmethod
+    def MERGE_BY_KEY(
+        cls, entity_type: Enum, target_value: list, key: str = "id"
+    ) -> "Operation":
+        """Replace the items of the entity having the key of an item of
+        target_value, append the others."""
+        assert isinstance(target_value, list), f"'{target_value}' is not a list"
+        return Operation(
+            Verbs.MERGE_BY_KEY, entity_type, {"key": key, "items": target_value}
+        )
+
+    @property
+    def is_streaming(self) -> bool:
+        return isinstance(self.target_value, Iterator)
+
+    def iter_encode(
+        self, encoder: json.JSONEncoder, chunk_size: int = STREAM_CHUNK_SIZE
+    ) -> Iterator[str]:
+        """Encode the operation to json chunks.
+
+        An iterator target_value is consumed lazily, chunk_size items at a time.
+        """
+        yield "{"
+        for index, (key, value) in enumerate(encode_default(self).items()):
+            yield f'{", " if index else ""}{encoder.encode(key)}: '
+            if isinstance(value, Iterator):
+                yield from iter_encode_items(value, encoder, chunk_size)
+            else:
+                yield encoder.encode(value)
+        yield "}"
+
+
+def escape_pointer(key: Union[str, int]) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def diff_values(old: Any, new: Any, path: str, patch: List[dict]) -> None:
+    if type(old) is type(new) and old == new:
+        return
+
+    if is_dataclass(old) and old.__class__ is new.__class__:
+        for field in fields(old):
+            diff_values(
+                getattr(old, field.name),
+                getattr(new, field.name),
+                f"{path}/{escape_pointer(field.name)}",
+                patch,
+            )
+    elif isinstance(old, list) and isinstance(new, list):
+        common = min(len(old), len(new))
+        for index in range(common):
+            diff_values(old[index], new[index], f"{path}/{index}", patch)
+        # Removing from the end keeps the indexes of the other items
+        for index in reversed(range(common, len(old))):
+            patch.append({"op": "remove", "path": f"{path}/{index}"})
+        for item in new[common:]:
+            patch.append({"op": "add", "path": f"{path}/-", "value": item})
+    elif isinstance(old, dict) and isinstance(new, dict):
+        for key, value in old.items():
+            pointer = f"{path}/{escape_pointer(key)}"
+            if key in new:
+                diff_values(value, new[key], pointer, patch)
+            else:
+                patch.append({"op": "remove", "path": pointer})
+        for key, value in new.items():
+            if key not in old:
+                pointer = f"{path}/{escape_pointer(key)}"
+                patch.append({"op": "add", "path": pointer, "value": value})
+    else:
+        patch.append({"op": "replace", "path": path, "value": new})
+
+
+def diff_contracts(old: Contract, new: Contract) -> List[dict]:
+    """Return the JSON patch style operations turning old into new.
+
+    Only changed fields are replaced, nested contracts and lists are diffed
+    item by item. Values are left for InstructionEncoder to encode.
+    """
+    assert old.__class__ is new.__class__, "Cannot diff different contracts"
+    patch: List[dict] = []
+    diff_values(old, new, "", patch)
+    return patch
+
+
+def apply_patch(data: Any, patch: List[dict]) -> Any:
+    """Apply the operations of a PATCH to json data, in place where possible.
+
+    The python counterpart of applyPatch of the generated typescript.
+    """
+    for operation in patch:
+        keys = [
+            key.replace("~1", "/").replace("~0", "~")
+            for key in operation["path"].split("/")[1:]
+        ]
+        if not keys:
+            data = operation.get("value")
+            continue
+
+        parent = data
+        for key in keys[:-1]:
+            parent = parent[int(key) if isinstance(parent, list) else key]
+        key = keys[-1]
+        if isinstance(parent, list):
+            if operation["op"] == "remove":
+                del parent[int(key)]
+            elif key == "-":
+                parent.append(operation["value"])
+            elif operation["op"] == "add":
+                parent.insert(int(key), operation["value"])
+            else:
+                parent[int(key)] = operation["value"]
+        elif operation["op"] == "remove":
+            del parent[key]
+        else:
+            parent[key] = operation["value"]
+    return data
+
+
+def build_field_plan(cls: type) -> Callable[[Any], dict]:
+    """Build a function that extracts the fields of dataclass instances of cls
+    into a shallow dict."""
+    names = tuple(field.name for field in fields(cls))
+    if not names:
+        return lambda obj: {}
+
+    if len(names) == 1:
+        name = names[0]
+        return lambda obj: {name: getattr(obj, name)}
+
+    getter = attrgetter(*names)
+    return lambda obj: dict(zip(names, getter(obj)))
+
+
+def encode_columns(columns: Columns) -> Any:
+    items = columns.items
+    if not items:
+        return []
+
+    cls = items[0].__class__
+    if any(item.__class__ is not cls for item in items):
+        raise TypeError(f"Columns of {cls.__name__} hold other classes")
+    names = [field.name for field in fields(cls)]
+    return {
+        "__columns__": names,
+        "__values__": [list(map(attrgetter(name), items)) for name in names],
+    }
+
+
+ENCODERS: Dict[type, Callable[[Any], Any]] = {
+    Columns: encode_columns,
+    RawJSON: attrgetter("value"),
+    Enum: attrgetter("name"),
+    Decimal: str,
+    datetime.date: methodcaller("isoformat"),
+    datetime.time: methodcaller("isoformat"),
+    uuid.UUID: str,
+}
+_type_encoders: Dict[type, Optional[Callable[[Any], Any]]] = {}
+
+
+def register_encoder(python_type: type, encoder: Callable[[Any], Any]) -> None:
+    """Encode instances of python_type, and its subclasses, with encoder.
+
+    e.g. register_encoder(uuid.UUID, str)
+    """
+    ENCODERS[python_type] = encoder
+    _type_encoders.clear()
+
+
+def get_encoder(python_type: type) -> Optional[Callable[[Any], Any]]:
+    """Return the encoder for instances of python_type, None if it has none."""
+    try:
+        return _type_encoders[python_type]
+    except KeyError:
+        pass
+
+    encoder: Optional[Callable[[Any], Any]] = None
+    for klass in python_type.__mro__:
+        if klass in ENCODERS:
+            encoder = ENCODERS[klass]
+            break
+    else:
+        if is_dataclass(python_type):
+            encoder = build_field_plan(python_type)
+        elif hasattr(python_type, "isoformat"):
+            encoder = methodcaller("isoformat")
+        elif issubclass(python_type, Iterator):
+            encoder = list
+
+    _type_encoders[python_type] = encoder
+    return encoder
+
+
+def build_iso_parser(
+    python_type: type, django_parser: Callable[[str], Any]
+) -> Callable[[str], Any]:
+    """Build the parser of the isoformat strings of python_type.
+
+    fromisoformat is used where available, it reads back what
+    InstructionEncoder writes. Django's slower parser handles what it rejects,
+    e.g. a "Z" suffix, and python 3.6.
+    """
+    fromisoformat = getattr(python_type, "fromisoformat", None)
+
+    def parse(value: str) -> Any:
+        if fromisoformat is not None:
+            try:
+                return fromisoformat(value)
+            except ValueError:
+                pass
+        parsed = django_parser(value)
+        if parsed is None:
+            raise ValueError(f"Invalid isoformat string: {value!r}")
+        return parsed
+
+    return parse
+
+
+def parse_decimal(value: Union[str, int, float]) -> Decimal:
+    # Decimal(0.1) would keep the binary error of the float
+    return Decimal(value if isinstance(value, (str, int)) else str(value))
+
+
+# Inverse of ENCODERS, used by the loaders of contracts
+DECODERS: Dict[type, Callable[[Any], Any]] = {
+    datetime.datetime: build_iso_parser(datetime.datetime, dateparse.parse_datetime),
+    datetime.date: build_iso_parser(datetime.date, dateparse.parse_date),
+    datetime.time: build_iso_parser(datetime.time, dateparse.parse_time),
+    Decimal: parse_decimal,
+    uuid.UUID: uuid.UUID,
+}
+
+
+def register_decoder(python_type: type, decoder: Callable[[Any], Any]) -> None:
+    """Load json values of fields typed python_type with decoder.
+
+    Register decoders before the contracts using them are first loaded, the
+    loaders are compiled once.
+    """
+    DECODERS[python_type] = decoder
+
+
+def encode_default(obj: Any) -> Any:
+    """Convert obj one level down to json compatible values.
+
+    Dataclasses become shallow dicts, their field values are left for the
+    caller to convert.
+    """
+    encoder = get_encoder(obj.__class__)
+    if encoder is None:
+        raise TypeError(
+            f"Object of type {obj.__class__.__name__} is not JSON serializable"
+        )
+
+    return encoder(obj)
+
+
+def json_key(key: Any) -> str:
+    """key as json encodes it, e.g. 1 -> "1" and None -> "null"."""
+    if isinstance(key, str):
+        return key
+    if key is None or isinstance(key, (int, float)):
+        return json.dumps(key)
+    raise TypeError(f"keys must be str, int, float, bool or None, not {type(key)}")
+
+
+def to_primitive(obj: Any) -> Any:
+    """Convert obj to dicts, lists and primitives in a single walk."""
+    if obj is None or isinstance(obj, (str, int, float)):
+        return obj
+    elif isinstance(obj, dict):
+        return {
+            key if key.__class__ is str else json_key(key): to_primitive(value)
+            for key, value in obj.items()
+        }
+    elif isinstance(obj, (list, tuple)):
+        return [to_primitive(item) for item in obj]
+
+    return to_primitive(encode_default(obj))
+
+
+def iter_encode_items(
+    items: Iterator, encoder: json.JSONEncoder, chunk_size: int
+) -> Iterator[str]:
+    """Encode items to a json array, chunk_size items at a time."""
+    yield "["
+    separator = ""
+    for chunk in iter(lambda: list(islice(items, chunk_size)), []):
+        # Strip the brackets of each encoded chunk to splice them together
+        yield separator + encoder.encode(chunk)[1:-1]
+        separator = ", "
+    yield "]"
+
+
+# Prefix of the placeholders of RawJSON values, unique to the process so it
+# cannot collide with encoded data
+RAW_JSON_MARKER = f"__sloto_raw_{uuid.uuid4().hex}_"
+RAW_JSON_PLACEHOLDER = re.compile(f'"{RAW_JSON_MARKER}([0-9]+)"')
+
 
 class InstructionEncoder(json.JSONEncoder):
+    """RawJSON values are encoded as placeholder strings, replaced with their
+    content once the rest is encoded."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.fragments: List[str] = []
+
+    def encode(self, obj) -> str:
+        self.fragments = []
+        encoded = super().encode(obj)
+        if not self.fragments:
+            return encoded
+        fragments = self.fragments
+        return RAW_JSON_PLACEHOLDER.sub(
+            lambda match: fragments[int(match[1])], encoded
+        )
+
     def default(self, obj) -> Any:
-        if isinstance(obj, Enum):
-            return obj.name
-        elif is_dataclass(obj):
-            return asdict(obj)
-        elif hasattr(obj, "isoformat"):
-            return obj.isoformat()
-        elif isinstance(obj, decimal.Decimal):
-            return str(obj)
+        if obj.__class__ is RawJSON:
+            self.fragments.append(obj.content)
+            return f"{RAW_JSON_MARKER}{len(self.fragments) - 1}"
+        encoder = get_encoder(obj.__class__)
+        if encoder is None:
+            return json.JSONEncoder.default(self, obj)
+        # Errors of the encoder itself propagate as they are
+        return encoder(obj)
 
-        return json.JSONEncoder.default(self, obj)
+
+class JsonCodec:
+    content_type = "application/json"
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return loads_json(data)
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, cls=InstructionEncoder).encode("utf-8")
+
+    def array(self, items: List[bytes]) -> bytes:
+        """Splice already encoded items into an array."""
+        return b"[" + b", ".join(items) + b"]"
+
+
+class MsgpackCodec:
+    """MessagePack bodies, values are encoded like InstructionEncoder does,
+    with the same field plans."""
+
+    content_type = "application/msgpack"
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        # Decodes straight from the request buffer
+        return msgpack.unpackb(data, raw=False)
+
+    def dumps(self, obj: Any) -> bytes:
+        return msgpack.packb(obj, default=encode_default, use_bin_type=True)
+
+    def array(self, items: List[bytes]) -> bytes:
+        return msgpack.Packer().pack_array_header(len(items)) + b"".join(items)
+
+
+Codec = Union[JsonCodec, MsgpackCodec]
+JSON_CODEC = JsonCodec()
+# Codecs by content type, msgpack needs the msgpack package
+CODECS: Dict[str, Codec] = {JsonCodec.content_type: JSON_CODEC}
+if msgpack:
+    CODECS[MsgpackCodec.content_type] = MsgpackCodec()
+    CODECS["application/x-msgpack"] = CODECS[MsgpackCodec.content_type]
+
+
+def request_codec(request: Any) -> Codec:
+    """Codec of the request body, according to its Content-Type."""
+    return CODECS.get(getattr(request, "content_type", ""), JSON_CODEC)
+
+
+def response_codec(request: Any) -> Codec:
+    """Codec of the Accept header of request with the highest quality, the
+    first one listed among equals. json by default."""
+    accepted = parse_quality_values(request.META.get("HTTP_ACCEPT", ""))
+    best: Codec = JSON_CODEC
+    best_quality = 0.0
+    for media_type, quality in accepted.items():
+        codec = CODECS.get(media_type)
+        if codec is not None and quality > best_quality:
+            best, best_quality = codec, quality
+    return best
 
 
 @dataclass
@@ -170,7 +1114,47 @@ class Instruction(Contract):
     redirect: str = ""
 
     def serialize(self) -> dict:
-        return json.loads(json.dumps(self, cls=InstructionEncoder))
+        return to_primitive(self)
+
+    def encode(self) -> bytes:
+        return json.dumps(self, cls=InstructionEncoder).encode("utf-8")
+
+    @property
+    def is_streaming(self) -> bool:
+        # Operations may be RawJSON
+        return any(
+            isinstance(operation, Operation) and operation.is_streaming
+            for operation in self.operations
+        )
+
+    def iter_encode(self, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[str]:
+        """Encode the instruction to json chunks, see Operation.iter_encode."""
+        encoder = InstructionEncoder()
+        yield "{"
+        for index, (key, value) in enumerate(encode_default(self).items()):
+            yield f'{", " if index else ""}{encoder.encode(key)}: '
+            if key == "operations":
+                yield "["
+                for position, operation in enumerate(value):
+                    if position:
+                        yield ", "
+                    if isinstance(operation, Operation):
+                        yield from operation.iter_encode(encoder, chunk_size)
+                    else:
+                        yield encoder.encode(operation)
+                yield "]"
+            else:
+                yield encoder.encode(value)
+        yield "}"
+
+
+class TransactionPolicy(Enum):
+    # Run resolve in autocommit mode
+    NONE = auto()
+    # Run resolve in a transaction
+    ATOMIC = auto()
+    # Run resolve in a transaction which is always rolled back
+    READ_ONLY = auto()
 
 
 class RequestResolver:
@@ -179,18 +1163,97 @@ class RequestResolver:
     pre_action: ClassVar[str] = ""
     callback: ClassVar[str] = ""
     use_jwt_authentication: ClassVar[bool] = True
-
-    def __init__(self, request, data: dict) -> None:
+    # Set for resolvers defining `async def resolve`
+    is_async: ClassVar[bool] = False
+    transaction_policy: ClassVar[TransactionPolicy] = TransactionPolicy.ATOMIC
+    # Database alias of the transaction, e.g. a replica for READ_ONLY
+    database: ClassVar[Optional[str]] = None
+    # Reject request bodies holding keys which are not fields of the contract
+    strict_data: ClassVar[bool] = False
+    # Cache the response for this many seconds, see InstructorView.cached_response.
+    # Only for resolvers whose result depends on nothing but data and user.
+    cache_timeout: ClassVar[Optional[int]] = None
+    # Django cache holding the responses
+    cache_alias: ClassVar[str] = DEFAULT_CACHE_ALIAS
+    # Invalidate the cached responses with response_cache.invalidate_tags
+    cache_tags: ClassVar[Sequence[str]] = ()
+    # Compress responses of at least this many bytes, None disables compression
+    compression_threshold: ClassVar[Optional[int]] = 1024
+    # Level of each content encoding, e.g. {"gzip": 9}, see compression.DEFAULT_LEVELS
+    compression_levels: ClassVar[Dict[str, int]] = {}
+    # Set by InstructorView for each request
+    metrics: Any = NULL_METRICS
+    # Set on each class by get_route
+    _sloto_route: ClassVar[Optional["Route"]] = None
+
+    def __init__(
+        self, request, data: Optional[dict] = None, body: Optional[bytes] = None
+    ) -> None:
+        """data is the decoded request body. Views pass the undecoded body
+        instead, it is decoded on first use of raw_data."""
         self.request = request
         self._data = data
-        self.clean_request_data()
+        self._body = body
+        self._validated = False
+
+    @cached_property
+    def raw_data(self) -> Any:
+        if self._body is not None:
+            return request_codec(self.request).loads(self._body)
+        return {} if self._data is None else self._data
+
+    @cached_property
+    def data(self) -> Any:
+        """The request body loaded into the contract annotating data, set by
+        clean_request_data on first access."""
+        with self.metrics.phase("load"):
+            self.clean_request_data()
+        return self.__dict__["data"]
+
+    def validate_data(self) -> None:
+        """Raise ValidationError if the body does not fit the contract.
+
+        InstructorView calls it before the transaction starts, so bad payloads
+        never reach the database. The body is loaded at the same time, so
+        formatted strings are parsed only once.
+        """
+        if not self._validated and get_route(self.__class__).contract is not None:
+            self.data
 
     def clean_request_data(self) -> None:
-        contract_class = self.__class__.__annotations__["data"]
-        if issubclass(contract_class, Contract):
-            self.data = contract_class.load_from_dict(self.request.data)
-        else:
+        """Set data. Overrides have to set it too, e.g. from load_data."""
+        self.data = self.load_data()
+
+    def load_data(self) -> Any:
+        """raw_data loaded into the contract annotating data."""
+        route = get_route(self.__class__)
+        if route.contract is None:
+            contract_class = self.__class__.__annotations__["data"]
             raise Exception(f"Unknown type for `data` f{contract_class}")
+        assert route.loader is not None
+
+        data = load_validated(
+            route.contract, route.loader, self.raw_data, self.strict_data
+        )
+        self._validated = True
+        return data
+
+    def canonical_data(self) -> str:
+        """data as canonical json, requests loading the same data share their
+        cached responses."""
+        return json.dumps(
+            to_primitive(self.data), sort_keys=True, separators=(",", ":")
+        )
+
+    def cache_user(self) -> str:
+        user = getattr(self.request, "user", None)
+        if user is None or not user.is_authenticated:
+            return ""
+        return str(user.pk)
+
+    def get_cache_tags(self) -> Sequence[str]:
+        """Override to tag responses with values of the request, e.g. ids."""
+        return self.cache_tags
 
     def __init_subclass__(cls, **kwargs):
         super().__init_subclass__(**kwargs)
@@ -200,14 +1263,83 @@ class RequestResolver:
             ), f"{cls} cannot define 'resovle' without annotating 'data'"
             if not cls.resolve.__annotations__:
                 raise BadResolver(f"{cls} must annotate resolve method if defined")
+            cls.is_async = inspect.iscoroutinefunction(cls.resolve)
+
+    @contextmanager
+    def transaction_context(self) -> Iterator[None]:
+        """Context in which resolve runs, according to transaction_policy."""
+        if self.transaction_policy is TransactionPolicy.NONE:
+            yield
+            return
+
+        with transaction.atomic(using=self.database):
+            yield
+            if self.transaction_policy is TransactionPolicy.READ_ONLY:
+                transaction.set_rollback(True, using=self.database)
+
+    def run_resolve(self) -> Any:
+        if self.is_async:
+            from asgiref.sync import async_to_sync
+
+            return async_to_sync(self.resolve)()
+
+        return self.resolve()
 
     def authenticate(self) -> None:
         if not self.use_jwt_authentication:
             return
 
+        # Resolvers of a batch share the request, authenticate it only once
+        if getattr(self.request, "jwt_authenticated", False):
+            return
+
         from .contrib.jwt_auth import authenticate_request
 
         authenticate_request(self.request)
+        self.request.jwt_authenticated = True
+
+
+class Route(NamedTuple):
+    """What InstructorView and code generation need to know of a resolver."""
+
+    resolver: Type[RequestResolver]
+    # None when data is not annotated with a Contract
+    contract: Optional[Type["Contract"]]
+    loader: Optional[Callable[[dict], Any]]
+    is_async: bool
+
+    def redux_action(self, endpoint: str) -> "ReduxAction":
+        return ReduxAction(
+            name=endpoint,
+            contract=self.resolver.__annotations__["data"],
+            pre_action=self.resolver.pre_action,
+            callback=self.resolver.callback,
+        )
+
+
+def get_route(resolver: Type[RequestResolver]) -> Route:
+    """The Route of resolver, built once and stored on the class."""
+    route = resolver.__dict__.get("_sloto_route")
+    if route is None:
+        contract = resolver.__annotations__.get("data")
+        if not is_subclass(contract, Contract):
+            contract = None
+        route = Route(
+            resolver=resolver,
+            contract=contract,
+            loader=contract and get_loader(contract),
+            is_async=resolver.is_async,
+        )
+        resolver._sloto_route = route
+    return route
+
+
+def returns_http_response(route: Route) -> bool:
+    """Whether resolve of the resolver of route is annotated to return an
+    HttpResponse, which cannot be part of a batch."""
+    resolve = getattr(route.resolver, "resolve", None)
+    annotations = getattr(resolve, "__annotations__", {})
+    return bool(is_subclass(annotations.get("return"), HttpResponse))
 
 
 class EntityTypes(Enum):
@@ -215,7 +1347,10 @@ class EntityTypes(Enum):
 
 
 def is_field_required(field: Field) -> bool:
-    return field.default is MISSING
+    return (
+        field.default is MISSING
+        and field.default_factory is MISSING  # type: ignore
+    )
 
 
 TYPE_MAP = {
@@ -225,13 +1360,480 @@ TYPE_MAP = {
     Decimal: "string",
     float: "number",
     datetime.datetime: "string",
+    datetime.date: "string",
+    datetime.time: "string",
+    uuid.UUID: "string",
     dict: "{}",
     Any: "any",
     list: "Array<any>",
 }
 
 
+PRIMITIVES = frozenset(TYPE_MAP)
+
+
+def resolve_field_types(cls: Type["Contract"]) -> Dict[str, Any]:
+    """Return the type of every field of cls, with forward references evaluated
+    where possible."""
+    try:
+        hints = get_type_hints(cls)
+    except (NameError, TypeError):
+        hints = {}
+    return {
+        name: hints.get(name, field.type) for name, field in cls.get_fields().items()
+    }
+
+
+def build_converter(value_type: Any) -> Optional[Callable[[Any], Any]]:
+    """Build a function that converts a json value to value_type.
+
+    Returns None if the value can be used as is.
+    """
+    if value_type in DECODERS:
+        decode = DECODERS[value_type]
+
+        def convert_decoded(value):
+            return value if isinstance(value, value_type) else decode(value)
+
+        return convert_decoded
+
+    if value_type in PRIMITIVES or value_type is type(None):
+        return None
+
+    if is_subclass(value_type, Enum):
+
+        def convert_enum(value):
+            return value_type[value if isinstance(value, str) else value.name]
+
+        return convert_enum
+
+    if is_dataclass(value_type):
+        # The loader of nested contracts is looked up lazily, it may not be
+        # compilable yet. Values are validated by the outermost contract.
+        def convert_contract(value):
+            return get_loader(value_type)(value)
+
+        return convert_contract
+
+    origin = getattr(value_type, "__origin__", None)
+    if origin == Union:
+        select = build_union_dispatch(value_type)
+        converters = [build_converter(arg) for arg in value_type.__args__]
+
+        def convert_union(value):
+            convert = converters[select(value)]
+            return value if convert is None else convert(value)
+
+        return convert_union
+
+    if origin in [list, List]:
+        # e.g. List[OtherSloto]
+        convert_item = build_converter(value_type.__args__[0])
+        if convert_item is None:
+            return list
+
+        def convert_list(value):
+            return [convert_item(item) for item in value]
+
+        return convert_list
+
+    if origin in [dict, Dict]:
+        # e.g. Dict[str, OtherSloto], keys are json strings and kept as they are
+        args = getattr(value_type, "__args__", None)
+        convert_value = build_converter(args[1]) if args else None
+        if convert_value is None:
+            return dict
+
+        def convert_dict(value):
+            return {key: convert_value(item) for key, item in value.items()}
+
+        return convert_dict
+
+    def convert_unknown(value):
+        raise Exception(f"not sure what to do with {value_type}: {value}")
+
+    return convert_unknown
+
+
+def compile_loader(cls: Type[T]) -> Callable[[dict], T]:
+    """Compile the function used by cls.load_from_dict and cache it on cls.
+
+    The loader expects data that passed the validator of cls.
+    """
+    contract_fields = cls.get_fields()
+    field_types = resolve_field_types(cls)
+    plain = []
+    converted = []
+    for name in contract_fields:
+        convert = build_converter(field_types[name])
+        if convert is None:
+            plain.append(name)
+        else:
+            converted.append((name, convert))
+
+    def load(data: dict) -> T:
+        kwargs = {}
+        for name in plain:
+            if name in data:
+                kwargs[name] = data[name]
+        for name, convert in converted:
+            if name in data:
+                kwargs[name] = convert(data[name])
+
+        return cls(**kwargs)  # type: ignore
+
+    setattr(cls, "_sloto_loader", load)
+    return load
+
+
+def get_loader(cls: Type[T]) -> Callable[[dict], T]:
+    return cls.__dict__.get("_sloto_loader") or compile_loader(cls)
+
+
+# Appends to errors what is wrong with value at path, the last argument is
+# strict
+Checker = Callable[[Any, str, List[dict], bool], None]
+
+# Json values accepted for the primitive types of TYPE_MAP
+ACCEPTED_TYPES: Dict[Any, tuple] = {
+    str: (str,),
+    bool: (bool,),
+    int: (int,),
+    Decimal: (str, int, float, Decimal),
+    float: (int, float),
+    datetime.datetime: (str, datetime.datetime),
+    datetime.date: (str, datetime.date),
+    datetime.time: (str, datetime.time),
+    uuid.UUID: (str, uuid.UUID),
+    dict: (dict,),
+    list: (list,),
+}
+
+
+def json_types(value_type: Any) -> Optional[tuple]:
+    """Types of the json values decoded as value_type, None if unknown."""
+    if value_type is type(None):
+        return (type(None),)
+    if value_type in ACCEPTED_TYPES:
+        return ACCEPTED_TYPES[value_type]
+    if is_subclass(value_type, Enum):
+        return (str, value_type)
+    if is_dataclass(value_type):
+        return (dict,)
+    origin = getattr(value_type, "__origin__", None)
+    if origin in [list, List]:
+        return (list,)
+    if origin in [dict, Dict]:
+        return (dict,)
+    return None
+
+
+def build_union_dispatch(value_type: Any) -> Callable[[Any], Optional[int]]:
+    """Build the function returning the index of the member of the Union
+    value_type a json value is decoded as, None if no member fits.
+
+    Values are dispatched on their type, the first member accepting a type
+    wins. Strings naming a member of an enum member are dispatched to it,
+    other strings to the first member accepting strings which is not an enum.
+    Dicts fitting several contracts are dispatched on a tag, see
+    build_contract_dispatch.
+    """
+    args = value_type.__args__
+    by_json_type: Dict[type, int] = {}
+    # Index of the enum member each member name belongs to, the first enum
+    # wins. Only enums listed before other members accepting strings.
+    enum_names: Dict[str, int] = {}
+    # First member accepting strings which is not an enum
+    string_index = None
+    # Member taking the values no other member accepts, e.g. Any
+    fallback = None
+    contracts: List[Tuple[int, Any]] = []
+    for index, arg in enumerate(args):
+        if is_dataclass(arg):
+            contracts.append((index, arg))
+        types = json_types(arg)
+        if types is None:
+            if fallback is None:
+                fallback = index
+            continue
+        if is_subclass(arg, Enum):
+            if string_index is None:
+                for name in arg.__members__:
+                    enum_names.setdefault(name, index)
+        elif str in types and string_index is None:
+            string_index = index
+        for json_type in types:
+            by_json_type.setdefault(json_type, index)
+
+    def select_type(value):
+        if enum_names and value.__class__ is str:
+            index = enum_names.get(value, string_index)
+            if index is not None:
+                return index
+        return by_json_type.get(value.__class__, fallback)
+
+    if len(contracts) < 2:
+        return select_type
+
+    select_contract = build_contract_dispatch(contracts)
+    dict_index = by_json_type[dict]
+
+    def select_with_contracts(value):
+        index = select_type(value)
+        if index == dict_index:
+            return select_contract(value)
+        return index
+
+    return select_with_contracts
+
+
+def build_contract_dispatch(
+    contracts: List[Tuple[int, Type["Contract"]]]
+) -> Callable[[dict], Optional[int]]:
+    """Build the function choosing which of contracts, (index, contract)
+    pairs, a dict is loaded as.
+
+    The tag is a field of every contract whose default, an enum member or a
+    string, differs between contracts, e.g. `kind: Shapes = Shapes.circle`.
+    Without a tag in the dict, a required field only one contract has decides.
+    Contracts without such a field are tried in order with their validator.
+    """
+    contract_fields = [(index, cls.get_fields()) for index, cls in contracts]
+    tag = None
+    tags: Dict[str, int] = {}
+    field_names = [set(field_map) for _, field_map in contract_fields]
+    common = set.intersection(*field_names)
+    for name in sorted(common):
+        tags = {}
+        for index, field_map in contract_fields:
+            default = field_map[name].default
+            if isinstance(default, Enum):
+                default = default.name
+            if not isinstance(default, str) or default in tags:
+                break
+            tags[default] = index
+        else:
+            tag = name
+            break
+
+    signatures = []
+    untagged = []
+    for position, (index, field_map) in enumerate(contract_fields):
+        others = set().union(*field_names[:position], *field_names[position + 1 :])
+        keys = sorted(
+            name
+            for name, field in field_map.items()
+            if is_field_required(field) and name not in others
+        )
+        if keys:
+            signatures.append((keys[0], index))
+        else:
+            untagged.append(index)
+    classes = dict(contracts)
+
+    def select_contract(value):
+        if tag is not None:
+            tag_value = value.get(tag)
+            if isinstance(tag_value, str) and tag_value in tags:
+                return tags[tag_value]
+        for key, index in signatures:
+            if key in value:
+                return index
+        if len(untagged) == 1:
+            return untagged[0]
+        for index in untagged:
+            errors: List[dict] = []
+            get_validator(classes[index])(value, "", errors, False)
+            if not errors:
+                return index
+        return None
+
+    return select_contract
+
+
+def type_error(path: str, value_type: Any, value: Any) -> dict:
+    return {
+        "path": path,
+        "code": "type",
+        "message": f"expected {python_type_to_typescript(value_type)}, "
+        f"got {type(value).__name__}",
+    }
+
+
+def build_checker(value_type: Any, formats: bool = True) -> Optional[Checker]:
+    """Build the function validating json values of value_type.
+
+    Without formats, any string is accepted for DECODERS types. Returns None
+    if any value is accepted.
+    """
+    if value_type in ACCEPTED_TYPES:
+        accepted = ACCEPTED_TYPES[value_type]
+        # bool is a subclass of int
+        reject_bool = bool not in accepted
+
+        def check_primitive(value, path, errors, strict):
+            if not isinstance(value, accepted) or (
+                reject_bool and value.__class__ is bool
+            ):
+                errors.append(type_error(path, value_type, value))
+
+        if value_type not in DECODERS or not formats:
+            return check_primitive
+
+        decode = DECODERS[value_type]
+
+        def check_decoded(value, path, errors, strict):
+            if value.__class__ is not str:
+                check_primitive(value, path, errors, strict)
+                return
+            try:
+                decode(value)
+            except (ValueError, ArithmeticError):
+                errors.append(
+                    {
+                        "path": path,
+                        "code": "format",
+                        "message": f"invalid {value_type.__name__}: {value!r}",
+                    }
+                )
+
+        return check_decoded
+
+    if is_subclass(value_type, Enum):
+        members = value_type.__members__
+
+        def check_enum(value, path, errors, strict):
+            if isinstance(value, value_type):
+                return
+            if not isinstance(value, str) or value not in members:
+                errors.append(
+                    {
+                        "path": path,
+                        "code": "enum",
+                        "message": f"expected one of {', '.join(members)}, "
+                        f"got {value!r}",
+                    }
+                )
+
+        return check_enum
+
+    if is_dataclass(value_type):
+
+        def check_contract(value, path, errors, strict):
+            if isinstance(value, dict):
+                get_validator(value_type, formats)(value, path, errors, strict)
+            else:
+                errors.append(type_error(path, value_type, value))
+
+        return check_contract
+
+    origin = getattr(value_type, "__origin__", None)
+    if origin == Union:
+        select = build_union_dispatch(value_type)
+        checkers = [build_checker(arg, formats) for arg in value_type.__args__]
+
+        def check_union(value, path, errors, strict):
+            index = select(value)
+            if index is None:
+                errors.append(type_error(path, value_type, value))
+                return
+            check = checkers[index]
+            if check is not None:
+                check(value, path, errors, strict)
+
+        return check_union
+
+    if origin in [list, List]:
+        check_item = build_checker(value_type.__args__[0], formats)
+
+        def check_list(value, path, errors, strict):
+            if not isinstance(value, list):
+                errors.append(type_error(path, value_type, value))
+            elif check_item is not None:
+                for index, item in enumerate(value):
+                    check_item(item, f"{path}[{index}]", errors, strict)
+
+        return check_list
+
+    if origin in [dict, Dict]:
+        args = getattr(value_type, "__args__", None)
+        check_value = build_checker(args[1], formats) if args else None
+
+        def check_dict(value, path, errors, strict):
+            if not isinstance(value, dict):
+                errors.append(type_error(path, value_type, value))
+            elif check_value is not None:
+                for key, item in value.items():
+                    check_value(item, f"{path}.{key}", errors, strict)
+
+        return check_dict
+
+    # Any, unresolved forward references, ...
+    return None
+
+
+def compile_validator(cls: Type["Contract"], formats: bool = True) -> Callable:
+    """Compile the function used by cls.validate and cache it on cls.
+
+    Presence, types, enum members and list items of all fields are checked in
+    one pass over data, appending every error found. See build_checker for
+    formats.
+    """
+    contract_fields = cls.get_fields()
+    field_types = resolve_field_types(cls)
+    checks = [
+        (name, is_field_required(field), build_checker(field_types[name], formats))
+        for name, field in contract_fields.items()
+    ]
+    names = frozenset(contract_fields)
+
+    def validate(data: dict, path: str, errors: List[dict], strict: bool) -> None:
+        prefix = f"{path}." if path else ""
+        for name, required, check in checks:
+            if name in data:
+                if check is not None:
+                    check(data[name], prefix + name, errors, strict)
+            elif required:
+                errors.append(
+                    {"path": prefix + name, "code": "missing", "message": "required"}
+                )
+
+        if strict and not data.keys() <= names:
+            for key in sorted(data.keys() - names):
+                errors.append(
+                    {"path": prefix + key, "code": "unknown", "message": "not a field"}
+                )
+
+    setattr(cls, validator_attribute(formats), validate)
+    return validate
+
+
+def validator_attribute(formats: bool) -> str:
+    return "_sloto_validator" if formats else "_sloto_shape_validator"
+
+
+def get_validator(cls: Type["Contract"], formats: bool = True) -> Callable:
+    return cls.__dict__.get(validator_attribute(formats)) or compile_validator(
+        cls, formats
+    )
+
+
+_typescript_types: Dict[Any, str] = {}
+
+
 def python_type_to_typescript(python_type: type) -> str:
+    """Memoized type_to_typescript."""
+    try:
+        return _typescript_types[python_type]
+    except KeyError:
+        typescript = _typescript_types[python_type] = type_to_typescript(python_type)
+        return typescript
+    except TypeError:
+        # Unhashable type
+        return type_to_typescript(python_type)
+
+
+def type_to_typescript(python_type: type) -> str:
     if python_type in TYPE_MAP:
         return TYPE_MAP[python_type]
 
@@ -248,9 +1850,18 @@ def python_type_to_typescript(python_type: type) -> str:
         args = getattr(python_type, "__args__")
         return "Array<{}>".format(python_type_to_typescript(args[0]))
 
+    if getattr(python_type, "__origin__", None) in [dict, Dict]:
+        args = getattr(python_type, "__args__", None)
+        if not args:
+            return TYPE_MAP[dict]
+        # json object keys are strings whatever the key type
+        return "{{[key: string]: {}}}".format(python_type_to_typescript(args[1]))
+
     if getattr(python_type, "__origin__", None) == Union:
         args = getattr(python_type, "__args__")
-        return "|".join(python_type_to_typescript(arg) for arg in args)
+        # e.g. Union[int, float] is number
+        members = dict.fromkeys(python_type_to_typescript(arg) for arg in args)
+        return "|".join(members)
 
     if isinstance(python_type, ForwardRef):
         return python_type.__forward_arg__
@@ -302,11 +1913,238 @@ def enum_to_typescript(enum_class: Type[Enum]) -> str:
     return "export enum {} {{\n{}\n}}".format(enum_class.__name__, body)
 
 
+def batch_to_typescript(batch_endpoint: str) -> str:
+    return f"""export interface SlotoBatchItem {{
+  endpoint: keyof typeof SLOTO_ACTION_CREATORS
+  body: any
+}}
+
+export function {batch_endpoint}(items: Array<SlotoBatchItem>): any {{
+    return (dispatch) => {{
+        return dispatch(
+            plugins.callBatchEndpoint("{batch_endpoint}", items)
+        )
+    }}
+}}"""
+
+
+def columns_to_typescript() -> str:
+    """expandColumns turns an encoded Columns back into an array of objects,
+    other values are returned as is."""
+    return """export function expandColumns(value: any): any {
+    if (!value || !Array.isArray(value.__columns__)) {
+        return value
+    }
+    const names: Array<string> = value.__columns__
+    const columns: Array<Array<any>> = value.__values__
+    const length = columns.length ? columns[0].length : 0
+    const items = new Array(length)
+    for (let index = 0; index < length; index++) {
+        const item = {}
+        for (let position = 0; position < names.length; position++) {
+            item[names[position]] = columns[position][index]
+        }
+        items[index] = item
+    }
+    return items
+}"""
+
+
+def patch_verbs_to_typescript() -> str:
+    """applyPatch and mergeByKey return the state of an entity updated by the
+    target_value of a PATCH or MERGE_BY_KEY operation, without mutating it."""
+    return """export interface SlotoPatchOperation {
+  op: "add" | "remove" | "replace"
+  path: string
+  value?: any
+}
+
+function patchIn(state: any, keys: Array<string>, operation: SlotoPatchOperation): any {
+    const key = keys[0]
+    const copy = Array.isArray(state) ? state.slice() : Object.assign({}, state)
+    if (keys.length > 1) {
+        copy[key] = patchIn(state[key], keys.slice(1), operation)
+    } else if (Array.isArray(copy)) {
+        if (operation.op === "remove") {
+            copy.splice(Number(key), 1)
+        } else if (key === "-") {
+            copy.push(operation.value)
+        } else if (operation.op === "add") {
+            copy.splice(Number(key), 0, operation.value)
+        } else {
+            copy[Number(key)] = operation.value
+        }
+    } else if (operation.op === "remove") {
+        delete copy[key]
+    } else {
+        copy[key] = operation.value
+    }
+    return copy
+}
+
+export function applyPatch(state: any, patch: Array<SlotoPatchOperation>): any {
+    return patch.reduce((current, operation) => {
+        const keys = operation.path.split("/").slice(1).map(
+            key => key.replace(/~1/g, "/").replace(/~0/g, "~")
+        )
+        return keys.length ? patchIn(current, keys, operation) : operation.value
+    }, state)
+}
+
+export function mergeByKey(
+    state: Array<any>, value: { key: string, items: Array<any> }
+): Array<any> {
+    const merged = (state || []).slice()
+    const positions = new Map()
+    merged.forEach((item, index) => positions.set(item[value.key], index))
+    for (const item of value.items) {
+        const index = positions.get(item[value.key])
+        if (index === undefined) {
+            positions.set(item[value.key], merged.length)
+            merged.push(item)
+        } else {
+            merged[index] = item
+        }
+    }
+    return merged
+}"""
+
+
+def msgpack_to_typescript() -> str:
+    """decodeMsgpack decodes the bodies of responses to requests accepting
+    application/msgpack. It covers what MsgpackCodec writes, no extension
+    types."""
+    return """export function decodeMsgpack(buffer: ArrayBuffer | Uint8Array): any {
+    const bytes = buffer instanceof Uint8Array ? buffer : new Uint8Array(buffer)
+    const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength)
+    const decoder = new TextDecoder()
+    let offset = 0
+
+    function skip(size: number): number {
+        const start = offset
+        offset += size
+        return start
+    }
+
+    function bin(length: number): Uint8Array {
+        return bytes.slice(offset, skip(length) + length)
+    }
+
+    function str(length: number): string {
+        return decoder.decode(bytes.subarray(offset, skip(length) + length))
+    }
+
+    function array(length: number): Array<any> {
+        const value = new Array(length)
+        for (let index = 0; index < length; index++) {
+            value[index] = read()
+        }
+        return value
+    }
+
+    function map(length: number): any {
+        const value: any = {}
+        for (let index = 0; index < length; index++) {
+            const key = read()
+            value[key] = read()
+        }
+        return value
+    }
+
+    function read(): any {
+        const type = bytes[offset++]
+        if (type < 0x80) {
+            return type
+        } else if (type < 0x90) {
+            return map(type & 0x0f)
+        } else if (type < 0xa0) {
+            return array(type & 0x0f)
+        } else if (type < 0xc0) {
+            return str(type & 0x1f)
+        } else if (type >= 0xe0) {
+            return type - 0x100
+        }
+        switch (type) {
+            case 0xc0: return null
+            case 0xc2: return false
+            case 0xc3: return true
+            case 0xc4: return bin(view.getUint8(skip(1)))
+            case 0xc5: return bin(view.getUint16(skip(2)))
+            case 0xc6: return bin(view.getUint32(skip(4)))
+            case 0xca: return view.getFloat32(skip(4))
+            case 0xcb: return view.getFloat64(skip(8))
+            case 0xcc: return view.getUint8(skip(1))
+            case 0xcd: return view.getUint16(skip(2))
+            case 0xce: return view.getUint32(skip(4))
+            case 0xcf: {
+                const start = skip(8)
+                return view.getUint32(start) * 4294967296 + view.getUint32(start + 4)
+            }
+            case 0xd0: return view.getInt8(skip(1))
+            case 0xd1: return view.getInt16(skip(2))
+            case 0xd2: return view.getInt32(skip(4))
+            case 0xd3: {
+                const start = skip(8)
+                return view.getInt32(start) * 4294967296 + view.getUint32(start + 4)
+            }
+            case 0xd9: return str(view.getUint8(skip(1)))
+            case 0xda: return str(view.getUint16(skip(2)))
+            case 0xdb: return str(view.getUint32(skip(4)))
+            case 0xdc: return array(view.getUint16(skip(2)))
+            case 0xdd: return array(view.getUint32(skip(4)))
+            case 0xde: return map(view.getUint16(skip(2)))
+            case 0xdf: return map(view.getUint32(skip(4)))
+        }
+        throw new Error(`Unsupported msgpack type 0x${type.toString(16)}`)
+    }
+
+    return read()
+}"""
+
+
+def typescript_fingerprint(definition: Union[Type[Contract], Type[Enum]]) -> str:
+    """Hash of everything the typescript of a contract or enum depends on."""
+    if issubclass(definition, Enum):
+        parts = [definition.__name__] + [member.name for member in definition]
+    else:
+        parts = [definition.__name__] + [
+            f"{name}:{is_field_required(field)}:{field.type!r}"
+            for name, field in definition.get_fields().items()
+        ]
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def definition_to_typescript(
+    definition: Union[Type[Contract], Type[Enum]],
+    cache: Optional[MutableMapping[str, str]] = None,
+) -> str:
+    """Typescript interface or enum for definition.
+
+    If given, cache maps typescript_fingerprint to previously generated blocks.
+    """
+    if cache is not None:
+        key = typescript_fingerprint(definition)
+        if key not in cache:
+            cache[key] = definition_to_typescript(definition)
+        return cache[key]
+
+    if issubclass(definition, Contract):
+        return definition.to_typescript_interface()
+
+    assert issubclass(definition, Enum)
+    return enum_to_typescript(definition)
+
+
 def contracts_to_typescript(
     *,
     dataclasses: List[Union[Type[Contract], Type[Enum]]],
     redux_actions: List[ReduxAction],
     import_plugins: bool = True,
+    batch_endpoint: str = "",
+    columnar: bool = False,
+    patch_verbs: bool = False,
+    msgpack_decoder: bool = False,
+    cache: Optional[MutableMapping[str, str]] = None,
 ) -> str:
     """
     Args:
@@ -314,14 +2152,20 @@ def contracts_to_typescript(
     interfaces.
         redux_actions: A list of ReduxAction to be converted to typescript
     creators.
+        batch_endpoint: InstructorView.batch_endpoint, if given a creator
+    calling several redux actions in one request is added. It is dispatched
+    through plugins.callBatchEndpoint.
+        columnar: Add expandColumns, for plugins to decode the target_value of
+    columnar operations.
+        patch_verbs: Add applyPatch and mergeByKey, for plugins to apply PATCH
+    and MERGE_BY_KEY operations.
+        msgpack_decoder: Add decodeMsgpack, for plugins requesting
+    application/msgpack responses.
+        cache: Generated blocks to reuse, see definition_to_typescript.
     """
     blocks = import_plugins and ['import * as plugins from "./plugins"'] or []
-    for index, contract in enumerate(dataclasses):
-        if issubclass(contract, Contract):
-            blocks.append(contract.to_typescript_interface())
-        else:
-            assert issubclass(contract, Enum)
-            blocks.append(enum_to_typescript(contract))
+    for contract in dataclasses:
+        blocks.append(definition_to_typescript(contract, cache))
 
     if redux_actions:
         blocks.append(
@@ -329,5 +2173,14 @@ def contracts_to_typescript(
         )
         names = ",\n".join([action.name for action in redux_actions])
         blocks.append(f"""export const SLOTO_ACTION_CREATORS = {{ {names} }}""")
+        if batch_endpoint:
+            blocks.append(batch_to_typescript(batch_endpoint))
+
+    if columnar:
+        blocks.append(columns_to_typescript())
+    if patch_verbs:
+        blocks.append(patch_verbs_to_typescript())
+    if msgpack_decoder:
+        blocks.append(msgpack_to_typescript())
 
     return "\n\n".join(blocks)
@@ -1,3 +1,6 @@
+from typing import Any, List, Optional
+
+
 class NotAuthenticated(Exception):
     pass
 
@@ -11,8 +14,36 @@ class BadResolver(Exception):
 
 
 class ValidationError(Exception):
-    pass
+    """Raised with every problem found in a payload.
+
+    errors holds one {"path": ..., "code": ..., "message": ...} dict per
+    problem, path being e.g. "members[0].gender". code is one of "missing",
+    "type", "format", "enum" or "unknown". The errors are given as the only
+    argument or as the errors keyword. Other arguments are kept like those of
+    any exception, errors is empty if it is not given.
+    """
+
+    def __init__(self, *args: Any, errors: Optional[List[dict]] = None) -> None:
+        if errors is None and len(args) == 1 and is_error_list(args[0]):
+            errors, args = args[0], ()
+        if errors and not args:
+            args = (
+                "; ".join(f"{error['path']}: {error['message']}" for error in errors),
+            )
+        super().__init__(*args)
+        self.errors = errors or []
+
+    @classmethod
+    def from_errors(cls, errors: List[dict]) -> "ValidationError":
+        """MissingField if only fields are missing, else ValidationError."""
+        if all(error["code"] == "missing" for error in errors):
+            return MissingField(errors=errors)
+        return ValidationError(errors=errors)
 
 
 class MissingField(ValidationError):
     pass
+
+
+def is_error_list(value: Any) -> bool:
+    return isinstance(value, list) and all(isinstance(item, dict) for item in value)
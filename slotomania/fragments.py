@@ -0,0 +1,36 @@
+"""
+Process wide cache of pre-encoded json fragments.
+
+A fragment is encoded once per version and spliced into every response using
+it, e.g. a lookup table identical for every user:
+
+    def resolve(self) -> Instruction:
+        rates = cached_fragment("rates", rates_version(), load_rates)
+        return Instruction([Operation.OVERWRITE(EntityTypes.RATE, rates), ...])
+
+A new version is encoded on first use. Versions shared by all processes can be
+taken from response_cache.tag_versions, invalidate_tags then renews the
+fragments too.
+"""
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from slotomania.core import RawJSON
+
+_fragments: Dict[str, Tuple[Hashable, RawJSON]] = {}
+
+
+def cached_fragment(key: str, version: Hashable, build: Callable[[], Any]) -> RawJSON:
+    """RawJSON of the value returned by build, encoded once per version."""
+    entry = _fragments.get(key)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+
+    # Concurrent requests may encode the same version, the last one is kept
+    fragment = RawJSON.encode(build())
+    _fragments[key] = (version, fragment)
+    return fragment
+
+
+def invalidate_fragment(key: str) -> None:
+    """Encode the fragment of key again on next use, whatever its version."""
+    _fragments.pop(key, None)
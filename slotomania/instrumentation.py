@@ -0,0 +1,144 @@
+"""
+Per request metrics for InstructorView.
+
+Sinks are objects with a `record(metrics, response)` method, listed in
+InstructorView.instrumentation_sinks. Without sinks every request shares
+NULL_METRICS, which records nothing.
+"""
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from django.db import connections
+
+
+class RequestMetrics:
+    """Timings, payload sizes and query count of one request."""
+
+    enabled = True
+
+    def __init__(self, endpoint: str, request_size: int = 0) -> None:
+        self.endpoint = endpoint
+        # Seconds spent in each phase, phases may be nested
+        self.timings: Dict[str, float] = {}
+        self.queries = 0
+        self.request_size = request_size
+        self.response_size: Optional[int] = None
+        # Bytes the compression removed from the response body
+        self.bytes_saved = 0
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed
+
+    @contextmanager
+    def count_queries(self) -> Iterator[None]:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self._count_query))
+            yield
+
+    def _count_query(self, execute, sql, params, many, context) -> Any:
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def finish(self, response: Any, sinks: List[Any]) -> None:
+        if not getattr(response, "streaming", False):
+            self.response_size = len(response.content)
+
+        for sink in sinks:
+            sink.record(self, response)
+
+
+class NullPhase:
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+class NullMetrics:
+    """Stand-in for RequestMetrics when instrumentation is disabled."""
+
+    enabled = False
+    _null_phase = NullPhase()
+
+    def phase(self, name: str) -> NullPhase:
+        return self._null_phase
+
+    def count_queries(self) -> NullPhase:
+        return self._null_phase
+
+    def finish(self, response: Any, sinks: List[Any]) -> None:
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+class LoggingSink:
+    """Log one line per request."""
+
+    def __init__(self, logger: str = __name__, level: int = logging.INFO) -> None:
+        self.logger = logging.getLogger(logger)
+        self.level = level
+
+    def record(self, metrics: RequestMetrics, response: Any) -> None:
+        if not self.logger.isEnabledFor(self.level):
+            return
+
+        timings = " ".join(
+            f"{name}={seconds * 1000:.2f}ms"
+            for name, seconds in metrics.timings.items()
+        )
+        self.logger.log(
+            self.level,
+            f"{metrics.endpoint} {timings} queries={metrics.queries} "
+            f"request_size={metrics.request_size} "
+            f"response_size={metrics.response_size} "
+            f"bytes_saved={metrics.bytes_saved}",
+        )
+
+
+class HistogramSink:
+    """Count the timings of each endpoint and phase in millisecond buckets."""
+
+    def __init__(
+        self, bounds: Sequence[float] = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+    ) -> None:
+        self.bounds = bounds
+        # endpoint -> phase -> count per bucket, the last bucket is unbounded
+        self.histograms: Dict[str, Dict[str, List[int]]] = defaultdict(dict)
+        self._lock = threading.Lock()
+
+    def record(self, metrics: RequestMetrics, response: Any) -> None:
+        with self._lock:
+            histograms = self.histograms[metrics.endpoint]
+            for name, seconds in metrics.timings.items():
+                counts = histograms.setdefault(name, [0] * (len(self.bounds) + 1))
+                counts[self.bucket(seconds * 1000)] += 1
+
+    def bucket(self, milliseconds: float) -> int:
+        for index, bound in enumerate(self.bounds):
+            if milliseconds <= bound:
+                return index
+        return len(self.bounds)
+
+
+class ServerTimingSink:
+    """Report the timings in a Server-Timing response header."""
+
+    def record(self, metrics: RequestMetrics, response: Any) -> None:
+        response["Server-Timing"] = ", ".join(
+            f"{name};dur={seconds * 1000:.3f}"
+            for name, seconds in metrics.timings.items()
+        )
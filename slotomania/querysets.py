@@ -0,0 +1,66 @@
+"""
+Contracts built straight from the rows of Django querysets.
+
+Rows are fetched with values_list in chunks, no model instance is created:
+
+    cards = iter_contracts(Card, models.Card.objects.filter(owner=user))
+    return Instruction([Operation.MERGE_APPEND(EntityTypes.CARD, cards)])
+
+An iterator target_value is streamed, see Instruction.iter_encode. Values are
+used as the database returns them, they are neither converted nor validated,
+so fields typed with a contract cannot be filled.
+"""
+from dataclasses import fields
+from itertools import starmap
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type
+
+from slotomania.core import T
+
+# Rows fetched from the database at once
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def contract_lookups(
+    contract: type, lookups: Optional[Dict[str, str]] = None
+) -> Tuple[List[str], List[str]]:
+    """Names of the init fields of contract and the lookup of each.
+
+    A field is looked up by its name unless lookups maps it to another lookup,
+    e.g. {"owner": "owner__username"}.
+    """
+    lookups = lookups or {}
+    names = [field.name for field in fields(contract) if field.init]
+    return names, [lookups.get(name, name) for name in names]
+
+
+def iter_values(
+    queryset: Any, expressions: List[str], chunk_size: int
+) -> Iterator[tuple]:
+    return queryset.values_list(*expressions).iterator(chunk_size=chunk_size)
+
+
+def iter_contracts(
+    contract: Type[T],
+    queryset: Any,
+    lookups: Optional[Dict[str, str]] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[T]:
+    """Yield an instance of contract per row of queryset."""
+    _, expressions = contract_lookups(contract, lookups)
+    # Rows hold the values of the init fields in order
+    return starmap(contract, iter_values(queryset, expressions, chunk_size))
+
+
+def iter_rows(
+    contract: type,
+    queryset: Any,
+    lookups: Optional[Dict[str, str]] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[dict]:
+    """Like iter_contracts, but yield the dicts the contracts would be encoded
+    to, without building the contracts."""
+    names, expressions = contract_lookups(contract, lookups)
+    return (
+        dict(zip(names, row))
+        for row in iter_values(queryset, expressions, chunk_size)
+    )
@@ -0,0 +1,83 @@
+"""
+Cache of the encoded responses of resolvers, stored in a Django cache.
+
+Resolvers opt in with RequestResolver.cache_timeout. Entries are keyed by
+endpoint, canonical request data, user, content type and the current version
+of each tag of the resolver. invalidate_tags gives the tags new versions, so
+the entries tagged with them are never read again and expire by themselves.
+"""
+import hashlib
+from typing import Any, Iterable, List, Optional, Sequence
+import uuid
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+
+PREFIX = "slotomania:response:"
+
+
+class CachedResponse:
+    """Encoded body of a response and its ETag."""
+
+    __slots__ = ("content", "content_type", "etag")
+
+    def __init__(self, content: bytes, content_type: str) -> None:
+        self.content = content
+        self.content_type = content_type
+        self.etag = f'"{hashlib.sha1(content).hexdigest()}"'
+
+
+def tag_key(tag: str) -> str:
+    return f"{PREFIX}tag:{tag}"
+
+
+def tag_versions(tags: Sequence[str], alias: str) -> List[str]:
+    cache = caches[alias]
+    keys = [tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        # Versions must outlive the entries using them
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def response_cache_key(
+    endpoint: str,
+    data: str,
+    user: str,
+    tags: Sequence[str],
+    content_type: str,
+    alias: str,
+) -> str:
+    parts = [endpoint, data, user, content_type] + tag_versions(tags, alias)
+    digest = hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+    return f"{PREFIX}{digest}"
+
+
+def get_cached_response(key: str, alias: str) -> Optional[CachedResponse]:
+    return caches[alias].get(key)
+
+
+def set_cached_response(
+    key: str, response: CachedResponse, timeout: int, alias: str
+) -> None:
+    caches[alias].set(key, response, timeout)
+
+
+def invalidate_tags(tags: Iterable[str], alias: str = DEFAULT_CACHE_ALIAS) -> None:
+    """Forget every cached response tagged with one of tags."""
+    caches[alias].set_many({tag_key(tag): uuid.uuid4().hex for tag in tags}, None)
+
+
+def is_not_modified(request: Any, etag: str) -> bool:
+    """Whether the If-None-Match header of request matches etag."""
+    header = request.META.get("HTTP_IF_NONE_MATCH")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(
+        candidate.strip().replace("W/", "", 1) == etag
+        for candidate in header.split(",")
+    )
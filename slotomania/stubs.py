@@ -0,0 +1,211 @@
+"""
+Render .pyi stubs of the contracts and enums of a module, replacing the
+stubgen + bin/fix_sloto_stubs.py pipeline.
+"""
+from dataclasses import MISSING, Field
+from enum import Enum
+import inspect
+from typing import Any, Dict, List, Set, TypeVar, Union
+from typing import ForwardRef  # type: ignore
+
+HEADER = "# Generated by slotomania, do not edit"
+
+
+class StubContext:
+    """What the annotations of a stub need from other modules."""
+
+    def __init__(self, module_name: str) -> None:
+        self.module_name = module_name
+        self.imports: Set[str] = set()
+        self.typevars: Dict[str, Any] = {}
+
+    def header(self) -> List[str]:
+        lines = [HEADER, "from dataclasses import dataclass"]
+        imports = sorted(self.imports - {self.module_name})
+        lines += [f"import {name}" for name in imports]
+        if self.typevars:
+            lines.append("")
+        for name, typevar in sorted(self.typevars.items()):
+            bound = typevar.__bound__
+            if bound is None:
+                lines.append(f'{name} = typing.TypeVar("{name}")')
+            else:
+                bound = format_annotation(bound, self)
+                lines.append(f'{name} = typing.TypeVar("{name}", bound="{bound}")')
+        return lines
+
+
+def format_annotation(annotation: Any, context: StubContext) -> str:
+    """Source of annotation as seen from the module of the stub."""
+    if annotation is None or annotation is type(None):
+        return "None"
+
+    if isinstance(annotation, str):
+        return annotation
+
+    if isinstance(annotation, ForwardRef):
+        return annotation.__forward_arg__
+
+    if isinstance(annotation, TypeVar):
+        context.imports.add("typing")
+        context.typevars[annotation.__name__] = annotation
+        return annotation.__name__
+
+    if isinstance(annotation, type) and not getattr(annotation, "__args__", None):
+        if annotation.__module__ in ["builtins", context.module_name]:
+            return annotation.__qualname__
+        context.imports.add(annotation.__module__)
+        return f"{annotation.__module__}.{annotation.__qualname__}"
+
+    if annotation is Any:
+        context.imports.add("typing")
+        return "typing.Any"
+
+    args = getattr(annotation, "__args__", None)
+    if getattr(annotation, "__origin__", None) is Union:
+        head = "typing.Union"
+    else:
+        head = repr(annotation).split("[")[0]
+    if head.startswith("typing."):
+        context.imports.add("typing")
+    if not args:
+        return head
+
+    formatted = ", ".join(format_annotation(arg, context) for arg in args)
+    return f"{head}[{formatted}]"
+
+
+def format_signature(function: Any, context: StubContext) -> str:
+    parameters = []
+    keyword_only_marked = False
+    for parameter in inspect.signature(function).parameters.values():
+        text = parameter.name
+        if parameter.kind is parameter.VAR_POSITIONAL:
+            text = f"*{text}"
+            keyword_only_marked = True
+        elif parameter.kind is parameter.VAR_KEYWORD:
+            text = f"**{text}"
+        elif parameter.kind is parameter.KEYWORD_ONLY and not keyword_only_marked:
+            parameters.append("*")
+            keyword_only_marked = True
+
+        if parameter.annotation is not parameter.empty:
+            annotation = format_annotation(parameter.annotation, context)
+            text = f"{text}: {annotation}"
+        if parameter.default is not parameter.empty:
+            text = f"{text} = ..."
+        parameters.append(text)
+
+    returns = ""
+    return_annotation = inspect.signature(function).return_annotation
+    if return_annotation is not inspect.Signature.empty:
+        returns = f" -> {format_annotation(return_annotation, context)}"
+    return f"({', '.join(parameters)}){returns}"
+
+
+def method_stubs(cls: type, context: StubContext) -> List[str]:
+    """Stubs of the public methods and properties defined by cls itself."""
+    lines = []
+    for name, attribute in vars(cls).items():
+        if name.startswith("_"):
+            continue
+
+        decorator = ""
+        function: Any
+        if isinstance(attribute, classmethod):
+            decorator, function = "@classmethod", attribute.__func__
+        elif isinstance(attribute, staticmethod):
+            decorator, function = "@staticmethod", attribute.__func__
+        elif isinstance(attribute, property):
+            decorator, function = "@property", attribute.fget
+        elif inspect.isfunction(attribute):
+            function = attribute
+        else:
+            continue
+
+        signature = format_signature(function, context)
+        if decorator:
+            lines.append(f"    {decorator}")
+        lines.append(f"    def {name}{signature}: ...")
+    return lines
+
+
+def has_default(field: Field) -> bool:
+    default_factory = field.default_factory  # type: ignore
+    return field.default is not MISSING or default_factory is not MISSING
+
+
+def class_header(cls: type, context: StubContext) -> str:
+    bases = ", ".join(
+        format_annotation(base, context) for base in cls.__bases__ if base is not object
+    )
+    return f"class {cls.__name__}({bases}):" if bases else f"class {cls.__name__}:"
+
+
+def contract_to_stub(cls: Any, context: StubContext) -> str:
+    lines = ["@dataclass", class_header(cls, context)]
+    for name, field in cls.get_fields().items():
+        annotation = format_annotation(field.type, context)
+        default = " = ..." if has_default(field) else ""
+        lines.append(f"    {name}: {annotation}{default}")
+
+    methods = method_stubs(cls, context)
+    if methods and len(lines) > 2:
+        lines.append("")
+    lines += methods
+    if len(lines) == 2:
+        lines.append("    pass")
+    return "\n".join(lines)
+
+
+def enum_to_stub(enum_class: Any, context: StubContext) -> str:
+    lines = [class_header(enum_class, context)]
+    for member in enum_class:
+        value = member.value
+        literal = repr(value) if isinstance(value, (int, str)) else "..."
+        lines.append(f"    {member.name} = {literal}")
+    lines += method_stubs(enum_class, context)
+    if len(lines) == 1:
+        lines.append("    pass")
+    return "\n".join(lines)
+
+
+def module_to_stub(module: Any, definitions: List[type]) -> str:
+    """Stub of module exposing definitions.
+
+    The other public names of the module are typed as Any through a module
+    level __getattr__, so the stub never hides them from type checkers.
+    """
+    context = StubContext(module.__name__)
+    blocks = [
+        enum_to_stub(definition, context)
+        if issubclass(definition, Enum)
+        else contract_to_stub(definition, context)
+        for definition in definitions
+    ]
+
+    emitted = {definition.__name__ for definition in definitions}
+    if any(
+        not name.startswith("_") and name not in emitted and not inspect.ismodule(obj)
+        for name, obj in vars(module).items()
+    ):
+        context.imports.add("typing")
+        blocks.append("def __getattr__(name: str) -> typing.Any: ...")
+
+    header = context.header()
+    return "\n".join(header) + "\n\n\n" + "\n\n\n".join(blocks) + "\n"
+
+
+def stub_path(module: Any) -> str:
+    path = module.__name__.replace(".", "/")
+    if hasattr(module, "__path__"):
+        return f"{path}/__init__.pyi"
+    return f"{path}.pyi"
+
+
+PACKAGE_STUB = f"""{HEADER}
+import typing
+
+
+def __getattr__(name: str) -> typing.Any: ...
+"""
@@ -1,11 +1,38 @@
+import gzip
 import json
+import time
 from typing import Any
+from unittest import mock, skipUnless
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from slotomania.exceptions import MissingField, NotAuthenticated
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from slotomania.contrib.jwt_auth import (
+    get_token_cache,
+    invalidate_cached_tokens,
+    user_snapshot,
+)
+from slotomania.instrumentation import HistogramSink, ServerTimingSink
+from slotomania.exceptions import MissingField, NotAuthenticated, ValidationError
+from slotomania.querysets import iter_rows
+from slotomania.response_cache import invalidate_tags
+from tests.phony.casino.views import (
+    AsyncInstructorView,
+    CachedCards,
+    CardQuery,
+    InstructorView,
+    UserRow,
+)
 
 
 class LoginTestCase(TestCase):
@@ -71,6 +98,16 @@ class ViewTestCase(TestCase):
                 HTTP_AUTHORIZATION=f"JWT",
             )
 
+    def test_authenticate_before_decoding_body(self) -> None:
+        self.jwt_auth_token = "badtoken"
+        with self.assertRaises(NotAuthenticated):
+            self.client.post(
+                reverse("api", args=["ReturnInstruction"]),
+                data="{not json",
+                content_type="application/json",
+                HTTP_AUTHORIZATION=f"JWT {self.jwt_auth_token}",
+            )
+
     def test_return_http_response(self) -> None:
         url = reverse("api", args=["ReturnHttpResponse"])
         response = self.POST(url, {})
@@ -86,3 +123,349 @@ class ViewTestCase(TestCase):
                 {"rank": 10, "width": "1.111", "played_at": "2000-01-01T00:00:00"}
             ],
         }
+
+    def test_stream_instruction(self) -> None:
+        url = reverse("api", args=["StreamInstruction"])
+        response = self.POST(url, {})
+        assert response.streaming
+        data = json.loads(b"".join(response.streaming_content))
+        cards = data["operations"][0]["target_value"]
+        assert len(cards) == 1200
+        assert cards[-1] == {
+            "rank": 1199,
+            "width": "1.111",
+            "played_at": "2000-01-01T00:00:00",
+        }
+
+    def test_batch(self) -> None:
+        url = reverse("api", args=["batch"])
+        response = self.POST(
+            url,
+            [
+                {"endpoint": "ReturnInstruction", "body": {}},
+                {"endpoint": "StreamInstruction", "body": {}},
+                {"endpoint": "LoginApp", "body": {"username": "a", "password": "b"}},
+            ],
+        )
+        assert response.status_code == 200
+        returned, streamed, login = response.data
+        assert returned["operations"][0]["target_value"][0]["rank"] == 10
+        assert len(streamed["operations"][0]["target_value"]) == 1200
+        assert login["errors"] == "bad credential"
+
+        self.jwt_auth_token = "badtoken"
+        with self.assertRaises(NotAuthenticated):
+            self.POST(url, [{"endpoint": "ReturnInstruction", "body": {}}])
+
+    def test_unknown_endpoint(self) -> None:
+        for name in ["api", "async-api"]:
+            response = self.POST(reverse(name, args=["Missing"]), {})
+            assert response.status_code == 404
+            assert response.data == {
+                "error": "unknown_endpoint",
+                "endpoints": ["Missing"],
+            }
+
+        response = self.POST(
+            reverse("api", args=["batch"]),
+            [
+                {"endpoint": "ReturnInstruction", "body": {}},
+                {"endpoint": "Missing", "body": {}},
+            ],
+        )
+        assert response.status_code == 404
+        assert response.data["endpoints"] == ["Missing"]
+
+        for body in [
+            {"endpoint": "ReturnInstruction"},
+            [{"body": {}}],
+            ["x"],
+            [{"endpoint": "ReturnInstruction", "body": "{}"}],
+            [{"endpoint": "ReturnInstruction", "body": []}],
+        ]:
+            response = self.POST(reverse("api", args=["batch"]), body)
+            assert response.status_code == 400
+            assert response.data["error"] == "invalid_batch"
+
+        response = self.POST(
+            reverse("api", args=["batch"]),
+            [
+                {"endpoint": "ReturnInstruction", "body": {}},
+                {"endpoint": "ReturnHttpResponse", "body": {}},
+            ],
+        )
+        assert response.status_code == 400
+        assert response.data == {
+            "error": "invalid_batch",
+            "message": "item 1 returns an HttpResponse, it cannot be batched",
+        }
+        with self.assertRaises(AssertionError):
+            InstructorView().encode_result(HttpResponse("hello"))
+
+    def test_dispatch_table(self) -> None:
+        route = InstructorView.dispatch_table["CachedCards"]
+        assert route.resolver is CachedCards
+        assert route.contract is CardQuery
+        assert route.loader({"rank": 1}) == CardQuery(rank=1)
+        assert route.redux_action("CachedCards").contract is CardQuery
+        assert AsyncInstructorView.dispatch_table == InstructorView.dispatch_table
+        with self.assertRaises(TypeError):
+            InstructorView.dispatch_table["Missing"] = route
+
+    def test_async_resolver(self) -> None:
+        expected = self.POST(reverse("api", args=["ReturnInstruction"]), {}).data
+        for name in ["api", "async-api"]:
+            for endpoint in ["ReturnInstruction", "ReturnAsyncInstruction"]:
+                response = self.POST(reverse(name, args=[endpoint]), {})
+                assert response.status_code == 200
+                assert json.loads(response.content) == expected
+
+        self.jwt_auth_token = "badtoken"
+        with self.assertRaises(NotAuthenticated):
+            self.POST(reverse("async-api", args=["ReturnAsyncInstruction"]), {})
+
+    def test_transaction_policy(self) -> None:
+        users = get_user_model().objects
+        read_only = self.POST(
+            reverse("api", args=["CreateUserReadOnly"]),
+            {"username": "reader", "password": "reader"},
+        )
+        assert not users.filter(username="reader").exists()
+
+        without_transaction = self.POST(
+            reverse("api", args=["CreateUserWithoutTransaction"]),
+            {"username": "writer", "password": "writer"},
+        )
+        assert users.filter(username="writer").exists()
+        assert (
+            read_only.data["savepoints"]
+            == without_transaction.data["savepoints"] + 1
+        )
+
+        for name in ["api", "async-api"]:
+            username = f"async-reader-{name}"
+            async_read_only = self.POST(
+                reverse(name, args=["AsyncCreateUserReadOnly"]),
+                {"username": username, "password": "reader"},
+            )
+            assert not users.filter(username=username).exists()
+            assert async_read_only.data == read_only.data
+
+            username = f"async-writer-{name}"
+            async_without_transaction = self.POST(
+                reverse(name, args=["AsyncCreateUserWithoutTransaction"]),
+                {"username": username, "password": "writer"},
+            )
+            assert users.filter(username=username).exists()
+            assert async_without_transaction.data == without_transaction.data
+
+    def test_validation_before_transaction(self) -> None:
+        url = reverse("api", args=["CreateUserWithoutTransaction"])
+        with CaptureQueriesContext(connection) as queries:
+            with self.assertRaises(ValidationError) as context:
+                self.POST(url, {"username": 1, "password": None})
+        assert [error["path"] for error in context.exception.errors] == [
+            "username",
+            "password",
+        ]
+        # At most the user was authenticated
+        assert not any("INSERT" in query["sql"] for query in queries)
+
+    def test_response_cache(self) -> None:
+        cache.clear()
+        url = reverse("api", args=["CachedCards"])
+        resolved = CachedCards.resolved
+        first = self.POST(url, {"rank": 1})
+        # Same data once loaded
+        second = self.POST(url, {"limit": 10, "rank": 1})
+        assert CachedCards.resolved == resolved + 1
+        assert first.content == second.content
+        assert first["ETag"] == second["ETag"]
+
+        not_modified = self.client.post(
+            url,
+            data=json.dumps({"rank": 1}),
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"JWT {self.jwt_auth_token}",
+            HTTP_IF_NONE_MATCH=first["ETag"],
+        )
+        assert not_modified.status_code == 304
+        assert not_modified.content == b""
+        assert CachedCards.resolved == resolved + 1
+
+        self.POST(url, {"rank": 2})
+        assert CachedCards.resolved == resolved + 2
+
+        invalidate_tags(["cards"])
+        assert self.POST(url, {"rank": 1}).content == first.content
+        assert CachedCards.resolved == resolved + 3
+
+        # Async resolvers are cached by AsyncInstructorView too
+        url = reverse("async-api", args=["CachedAsyncCards"])
+        first = self.POST(url, {"rank": 1})
+        assert self.POST(url, {"rank": 1})["ETag"] == first["ETag"]
+        assert CachedCards.resolved == resolved + 4
+
+    @skipUnless(msgpack, "msgpack is not installed")
+    def test_msgpack(self) -> None:
+        def post(endpoint: str, data: Any) -> Any:
+            return self.client.post(
+                reverse("api", args=[endpoint]),
+                data=msgpack.packb(data),
+                content_type="application/msgpack",
+                HTTP_ACCEPT="application/msgpack, application/json;q=0.5",
+                HTTP_AUTHORIZATION=f"JWT {self.jwt_auth_token}",
+            )
+
+        expected = self.POST(reverse("api", args=["ReturnInstruction"]), {}).data
+        response = post("ReturnInstruction", {})
+        assert response["Content-Type"] == "application/msgpack"
+        assert msgpack.unpackb(response.content, raw=False) == expected
+        assert "Accept" in response["Vary"]
+
+        refused = self.client.post(
+            reverse("api", args=["ReturnInstruction"]),
+            data=b"{}",
+            content_type="application/json",
+            HTTP_ACCEPT="application/msgpack;q=0, application/json",
+            HTTP_AUTHORIZATION=f"JWT {self.jwt_auth_token}",
+        )
+        assert refused["Content-Type"] == "application/json"
+        assert refused.data == expected
+
+        response = post(
+            "CreateUserWithoutTransaction", {"username": "packed", "password": "a"}
+        )
+        assert "savepoints" in msgpack.unpackb(response.content, raw=False)
+        assert get_user_model().objects.filter(username="packed").exists()
+
+        response = post(
+            "batch",
+            [
+                {"endpoint": "ReturnInstruction", "body": {}},
+                {"endpoint": "CachedCards", "body": {"rank": 1}},
+            ],
+        )
+        results = msgpack.unpackb(response.content, raw=False)
+        assert results[0] == expected
+        assert results[1]["operations"][0]["target_value"][0]["width"] == "10"
+
+    def test_compression(self) -> None:
+        def post(endpoint: str, data: Any, encoding: str = "gzip") -> Any:
+            return self.client.post(
+                reverse("api", args=[endpoint]),
+                data=json.dumps(data),
+                content_type="application/json",
+                HTTP_ACCEPT_ENCODING=encoding,
+                HTTP_AUTHORIZATION=f"JWT {self.jwt_auth_token}",
+            )
+
+        # Below the threshold
+        response = post("ReturnInstruction", {})
+        assert not response.has_header("Content-Encoding")
+        assert response["Vary"] == "Accept, Accept-Encoding"
+
+        response = post("StreamInstruction", {})
+        assert response["Content-Encoding"] == "gzip"
+        compressed = b"".join(response.streaming_content)
+        content = gzip.decompress(compressed)
+        assert len(json.loads(content)["operations"][0]["target_value"]) == 1200
+        # Small chunks are compressed together
+        assert len(compressed) < len(gzip.compress(content)) * 1.1
+
+        recorded = []
+        sink = mock.Mock(record=lambda metrics, response: recorded.append(metrics))
+        items = [
+            {"endpoint": "CachedCards", "body": {"rank": rank}} for rank in range(20)
+        ]
+        with mock.patch.object(InstructorView, "instrumentation_sinks", [sink]):
+            response = post("batch", items)
+            assert not post("batch", items, "gzip;q=0, identity").has_header(
+                "Content-Encoding"
+            )
+        assert response["Content-Encoding"] == "gzip"
+        content = gzip.decompress(response.content)
+        assert len(json.loads(content)) == 20
+        metrics = recorded[0]
+        assert metrics.bytes_saved == len(content) - len(response.content)
+        assert "compress" in metrics.timings
+
+    def test_queryset_contracts(self) -> None:
+        users = get_user_model().objects
+        for number in range(4):
+            users.create(username=f"user{number}")
+        expected = [
+            {"id": user.id, "name": user.username, "is_active": user.is_active}
+            for user in users.order_by("id")
+        ]
+
+        response = self.POST(reverse("api", args=["ListUsers"]), {})
+        assert response.streaming
+        data = json.loads(b"".join(response.streaming_content))
+        assert data["operations"][0]["target_value"] == expected
+
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(iter_rows(UserRow, users.order_by("id"), {"name": "username"}))
+        assert rows == expected
+        assert len(queries) == 1
+
+    def test_token_cache(self) -> None:
+        url = reverse("api", args=["ReturnInstruction"])
+        for backend in ["local", "django"]:
+            self.user.is_active = True
+            self.user.save()
+            with override_settings(JWT_TOKEN_CACHE=backend):
+                invalidate_cached_tokens(self.user)
+                query_counts = []
+                for _ in range(2):
+                    with CaptureQueriesContext(connection) as queries:
+                        assert self.POST(url, {}).status_code == 200
+                    query_counts.append(len(queries))
+
+                # The user is only looked up for the first request
+                assert query_counts[1] == query_counts[0] - 1
+
+                # Each hit builds its own user from the cached field values
+                token_cache = get_token_cache()
+                first = token_cache.get(self.jwt_auth_token)[1]
+                second = token_cache.get(self.jwt_auth_token)[1]
+                assert first == self.user and first.username == self.user.username
+                assert first is not second and first._state is not second._state
+                # Secrets are not cached, they are loaded when accessed
+                assert self.user.password not in user_snapshot(self.user)[1]
+                assert "password" in first.get_deferred_fields()
+                assert first.check_password("tester")
+                token_cache.set("other", {}, self.user, time.time() + 60)
+
+                self.user.is_active = False
+                self.user.save()
+                with self.assertRaises(NotAuthenticated):
+                    self.POST(url, {})
+                assert token_cache.get("other") is None
+
+    def test_instrumentation(self) -> None:
+        histogram = HistogramSink()
+        recorded = []
+        sinks = [
+            histogram,
+            ServerTimingSink(),
+            mock.Mock(record=lambda metrics, response: recorded.append(metrics)),
+        ]
+        with mock.patch.object(InstructorView, "instrumentation_sinks", sinks):
+            response = self.POST(
+                reverse("api", args=["CreateUserWithoutTransaction"]),
+                {"username": "a", "password": "b"},
+            )
+
+        phases = ["authenticate", "parse", "validate", "transaction", "resolve"]
+        phases += ["load", "serialize"]
+        timings = response["Server-Timing"].split(", ")
+        assert sorted(timing.split(";")[0] for timing in timings) == sorted(phases)
+        assert all(
+            sum(histogram.histograms["CreateUserWithoutTransaction"][phase]) == 1
+            for phase in phases
+        )
+        metrics = recorded[0]
+        assert metrics.queries > 0
+        assert metrics.request_size == len(b'{"username": "a", "password": "b"}')
+        assert metrics.response_size == len(response.content)
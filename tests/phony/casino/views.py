@@ -1,15 +1,21 @@
+import asyncio
 from dataclasses import dataclass
 import datetime
 from decimal import Decimal
 from enum import Enum
 
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import connection
 from django.http import HttpResponse
 
 from slotomania.contrib import contracts
 from slotomania.contrib.jwt_auth import AuthenticateUser
+from slotomania.core import AsyncInstructorView as AsyncBaseView
 from slotomania.core import Contract, Instruction
 from slotomania.core import InstructorView as BaseView
-from slotomania.core import Operation, RequestResolver
+from slotomania.core import Operation, RequestResolver, TransactionPolicy
+from slotomania.querysets import iter_contracts
 
 
 @dataclass
@@ -21,6 +27,7 @@ class Card(Contract):
 
 class PhonyEntityTypes(Enum):
     CARD = 1
+    USER = 2
 
 
 class ReturnHttpResponse(RequestResolver):
@@ -51,9 +58,135 @@ class ReturnInstruction(RequestResolver):
         )
 
 
+class StreamInstruction(RequestResolver):
+    data: contracts.EmptyBodySchema
+
+    def resolve(self) -> Instruction:
+        cards = (
+            Card(
+                rank=rank,
+                width=Decimal("1.111"),
+                played_at=datetime.datetime(2000, 1, 1, 0, 0, 0),
+            )
+            for rank in range(1200)
+        )
+        return Instruction([Operation.MERGE_APPEND(PhonyEntityTypes.CARD, cards)])
+
+
+class ReturnAsyncInstruction(RequestResolver):
+    data: contracts.EmptyBodySchema
+
+    async def resolve(self) -> Instruction:
+        await asyncio.sleep(0)
+        return ReturnInstruction(self.request, self.raw_data).resolve()
+
+
+def create_user(resolver: RequestResolver) -> dict:
+    get_user_model().objects.create_user(
+        username=resolver.data.username, password=resolver.data.password
+    )
+    return {"savepoints": len(connection.savepoint_ids)}
+
+
+@dataclass
+class CardQuery(Contract):
+    rank: int
+    limit: int = 10
+
+
+class CachedCards(RequestResolver):
+    data: CardQuery
+    cache_timeout = 60
+    cache_tags = ["cards"]
+    # Number of calls of resolve
+    resolved = 0
+
+    def resolve(self) -> Instruction:
+        CachedCards.resolved += 1
+        cards = [
+            Card(
+                rank=self.data.rank,
+                width=Decimal(self.data.limit),
+                played_at=datetime.datetime(2000, 1, 1, 0, 0, 0),
+            )
+        ]
+        return Instruction([Operation.OVERWRITE(PhonyEntityTypes.CARD, cards)])
+
+
+class CachedAsyncCards(CachedCards):
+    data: CardQuery
+
+    async def resolve(self) -> Instruction:
+        await asyncio.sleep(0)
+        return CachedCards.resolve(self)
+
+
+class CreateUserReadOnly(RequestResolver):
+    data: contracts.AuthenticateUserRequest
+    transaction_policy = TransactionPolicy.READ_ONLY
+
+    def resolve(self) -> dict:
+        return create_user(self)
+
+
+class CreateUserWithoutTransaction(RequestResolver):
+    data: contracts.AuthenticateUserRequest
+    transaction_policy = TransactionPolicy.NONE
+
+    def resolve(self) -> dict:
+        return create_user(self)
+
+
+class AsyncCreateUserReadOnly(CreateUserReadOnly):
+    data: contracts.AuthenticateUserRequest
+
+    async def resolve(self) -> dict:
+        return await sync_to_async(create_user)(self)
+
+
+class AsyncCreateUserWithoutTransaction(CreateUserWithoutTransaction):
+    data: contracts.AuthenticateUserRequest
+
+    async def resolve(self) -> dict:
+        return await sync_to_async(create_user)(self)
+
+
+@dataclass
+class UserRow(Contract):
+    id: int
+    name: str
+    is_active: bool
+
+
+class ListUsers(RequestResolver):
+    data: contracts.EmptyBodySchema
+
+    def resolve(self) -> Instruction:
+        users = iter_contracts(
+            UserRow,
+            get_user_model().objects.order_by("id"),
+            {"name": "username"},
+            chunk_size=2,
+        )
+        return Instruction([Operation.MERGE_APPEND(PhonyEntityTypes.USER, users)])
+
+
 class InstructorView(BaseView):
     routes = {
         "LoginApp": AuthenticateUser,
         "ReturnHttpResponse": ReturnHttpResponse,
         "ReturnInstruction": ReturnInstruction,
+        "StreamInstruction": StreamInstruction,
+        "ReturnAsyncInstruction": ReturnAsyncInstruction,
+        "CreateUserReadOnly": CreateUserReadOnly,
+        "CreateUserWithoutTransaction": CreateUserWithoutTransaction,
+        "AsyncCreateUserReadOnly": AsyncCreateUserReadOnly,
+        "AsyncCreateUserWithoutTransaction": AsyncCreateUserWithoutTransaction,
+        "CachedCards": CachedCards,
+        "CachedAsyncCards": CachedAsyncCards,
+        "ListUsers": ListUsers,
     }
+
+
+class AsyncInstructorView(AsyncBaseView):
+    routes = InstructorView.routes
@@ -17,9 +17,14 @@ from django.contrib import admin
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
 
-from tests.phony.casino.views import InstructorView
+from tests.phony.casino.views import AsyncInstructorView, InstructorView
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/<str:endpoint>", csrf_exempt(InstructorView.as_view()), name="api"),
+    path(
+        "async-api/<str:endpoint>",
+        csrf_exempt(AsyncInstructorView.as_view()),
+        name="async-api",
+    ),
 ]
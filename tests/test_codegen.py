@@ -0,0 +1,150 @@
+from dataclasses import dataclass
+import os
+import sys
+import tempfile
+from typing import List
+from unittest import TestCase
+
+from slotomania.codegen import (
+    HELPERS_MODULE,
+    TypescriptCache,
+    discover,
+    generate_stubs,
+    generate_typescript,
+    module_mtimes,
+    module_path,
+    relative_import,
+    reload_changed_modules,
+    write_if_changed,
+)
+from slotomania.core import (
+    Contract,
+    ReduxAction,
+    contracts_to_typescript,
+    typescript_fingerprint,
+)
+from tests.test_core import Address, Gender, Person
+
+
+@dataclass
+class Neighborhood(Contract):
+    residents: List[Person]
+    streets: List["Address"]
+
+
+class TypescriptCacheTestCase(TestCase):
+    def test_cached_blocks(self) -> None:
+        kwargs = dict(
+            dataclasses=[Gender, Address, Person],
+            redux_actions=[ReduxAction(name="CreatePerson", contract=Person)],
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache.json")
+            cache = TypescriptCache(path)
+            typescript = contracts_to_typescript(cache=cache, **kwargs)
+            assert typescript == contracts_to_typescript(**kwargs)
+            assert len(cache) == 3
+            cache.save()
+
+            cache = TypescriptCache(path)
+            cache[typescript_fingerprint(Person)] = "cached"
+            assert "\n\ncached\n\n" in contracts_to_typescript(cache=cache, **kwargs)
+
+    def test_write_if_changed(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "index.ts")
+            assert write_if_changed(path, "a")
+            assert not write_if_changed(path, "a")
+            assert write_if_changed(path, "b")
+
+    def test_reload_changed_modules(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "sloto_watched.py")
+            with open(path, "w") as f:
+                f.write("VALUE = 1\n")
+            sys.path.insert(0, directory)
+            try:
+                import sloto_watched
+
+                mtimes = module_mtimes(["sloto_watched"])
+                assert reload_changed_modules(mtimes) == []
+
+                with open(path, "w") as f:
+                    f.write("VALUE = 2\n")
+                os.utime(path, (0, mtimes["sloto_watched"] + 10))
+                assert reload_changed_modules(mtimes) == ["sloto_watched"]
+                assert sloto_watched.VALUE == 2
+            finally:
+                sys.path.remove(directory)
+                sys.modules.pop("sloto_watched", None)
+
+
+class DiscoveryTestCase(TestCase):
+    def test_generate_module_per_module(self) -> None:
+        # pytest may import this file as a top level module
+        modules = discover([Person.__module__, __name__])
+        assert modules[Person.__module__].definitions == [Gender, Address, Person]
+        assert modules[__name__].definitions == [Neighborhood]
+
+        generated = generate_typescript(modules, "out")
+        test_core = relative_import(__name__, module_path(Person.__module__, ""))
+        assert generated[os.path.join("out", module_path(__name__))] == (
+            f"""import {{ Address, Person }} from "{test_core}"
+
+export interface Neighborhood {{
+  residents: Array<Person>
+  streets: Array<Address>
+}}
+"""
+        )
+        assert generate_typescript(modules, "out", jobs=2) == generated
+
+        modules = discover(["tests.phony"], exclude=["*.tests", "*.migrations"])
+        generated = generate_typescript(modules, "out")
+        views = generated["out/tests/phony/casino/views.ts"]
+        assert views.startswith('import * as plugins from "../../../plugins"')
+        assert views.count("export function ReturnInstruction(") == 1
+        # Contracts of resolvers outside the scanned packages are generated too
+        assert "import { AuthenticateUserRequest, EmptyBodySchema }" in views
+        contracts = generated["out/slotomania/contrib/contracts.ts"]
+        assert "export interface EmptyBodySchema" in contracts
+
+        cache: dict = {}
+        assert generate_typescript(modules, "out", jobs=2, cache=cache) == generated
+        # Blocks rendered by the workers are cached
+        assert len(cache) == sum(len(module.definitions) for module in modules.values())
+
+        generated = generate_typescript(
+            modules, "out", batch=True, columnar=True, patch_verbs=True
+        )
+        views = generated["out/tests/phony/casino/views.ts"]
+        assert "export function batch(items: Array<SlotoBatchItem>)" in views
+        helpers = generated[os.path.join("out", HELPERS_MODULE)]
+        assert "export function expandColumns(" in helpers
+        assert "export function applyPatch(" in helpers
+        assert "decodeMsgpack" not in helpers
+
+    def test_generate_stubs(self) -> None:
+        modules = discover([Person.__module__, __name__])
+        stubs = generate_stubs(modules, "out")
+        stub = stubs[os.path.join("out", module_path(Person.__module__, ".pyi"))]
+        assert """
+class Gender(enum.Enum):
+    male = 1
+    female = 2
+
+
+@dataclass
+class Address(slotomania.core.Contract):
+    street: str
+
+
+@dataclass
+class Person(slotomania.core.Contract):
+    name: str
+    gender: Gender
+    birth_date: datetime.datetime
+    addresses: typing.Union[typing.List[Address], None] = ...
+""" in stub
+        assert stub.endswith("def __getattr__(name: str) -> typing.Any: ...\n")
+        assert os.path.join("out", "tests", "__init__.pyi") in stubs
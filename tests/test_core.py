@@ -1,8 +1,11 @@
-from dataclasses import asdict, dataclass, is_dataclass
+from dataclasses import asdict, dataclass, field, is_dataclass
 import datetime
+from decimal import Decimal
 from enum import Enum
-from typing import List, Optional
+import json
+from typing import Dict, List, Optional, Union
 from unittest import TestCase
+import uuid
 
 from slotomania.contrib.contracts import AuthenticateUserRequest
 from slotomania.core import (
@@ -10,9 +13,19 @@ from slotomania.core import (
     EntityTypes,
     Instruction,
     Operation,
+    RawJSON,
     ReduxAction,
+    RequestResolver,
+    apply_patch,
     contracts_to_typescript,
+    diff_contracts,
+    expand_columns,
+    register_encoder,
+    slotted,
+    to_primitive,
 )
+from slotomania.exceptions import MissingField, ValidationError
+from slotomania.fragments import cached_fragment, invalidate_fragment
 
 
 class Gender(Enum):
@@ -72,6 +85,280 @@ export const SLOTO_ACTION_CREATORS = { CreatePerson }"""
 
         assert man == man.load_from_dict(asdict(man))
 
+    def test_batch_to_typescript(self) -> None:
+        typescript = contracts_to_typescript(
+            dataclasses=[],
+            redux_actions=[ReduxAction(name="CreatePerson", contract=Person)],
+            import_plugins=False,
+            batch_endpoint="batch",
+        )
+        assert typescript.endswith(
+            """export interface SlotoBatchItem {
+  endpoint: keyof typeof SLOTO_ACTION_CREATORS
+  body: any
+}
+
+export function batch(items: Array<SlotoBatchItem>): any {
+    return (dispatch) => {
+        return dispatch(
+            plugins.callBatchEndpoint("batch", items)
+        )
+    }
+}"""
+        )
+
+    def test_load_from_dict_compiles_loader_once(self) -> None:
+        @dataclass
+        class Family(Contract):
+            members: List[Person]
+            tags: List[str]
+
+        data = {
+            "tags": ["a", "b"],
+            "members": [
+                {
+                    "name": "Bond",
+                    "gender": "male",
+                    "birth_date": "2000-01-01T00:00:00",
+                    "addresses": [{"street": "easy street"}],
+                }
+            ],
+        }
+        family = Family.load_from_dict(data)
+        loader = Family.__dict__["_sloto_loader"]
+        assert family == Family.load_from_dict(data)
+        assert Family.__dict__["_sloto_loader"] is loader
+        assert "_sloto_loader" not in Contract.__dict__
+        assert family.members[0].gender is Gender.male
+        assert family.members[0].addresses == [Address("easy street")]
+        with self.assertRaises(MissingField):
+            Family.load_from_dict({"tags": []})
+
+    def test_validation_errors(self) -> None:
+        data = {
+            "name": 1,
+            "gender": "robot",
+            "addresses": [{"street": "easy street"}, {"street": True}, "home"],
+            "age": 30,
+        }
+        with self.assertRaises(ValidationError) as context:
+            Person.load_from_dict(data, strict=True)
+        assert context.exception.errors == [
+            {"path": "name", "code": "type", "message": "expected string, got int"},
+            {
+                "path": "gender",
+                "code": "enum",
+                "message": "expected one of male, female, got 'robot'",
+            },
+            {"path": "birth_date", "code": "missing", "message": "required"},
+            {
+                "path": "addresses[1].street",
+                "code": "type",
+                "message": "expected string, got bool",
+            },
+            {
+                "path": "addresses[2]",
+                "code": "type",
+                "message": "expected Address, got str",
+            },
+            {"path": "age", "code": "unknown", "message": "not a field"},
+        ]
+        assert not isinstance(context.exception, MissingField)
+
+        data = {"name": "Bond", "gender": "male", "birth_date": "2000-01-01"}
+        assert Person.validate(data) == []
+        assert Person.validate({**data, "addresses": None}) == []
+        assert Person.validate({**data, "age": 30}) == []
+
+        with self.assertRaises(MissingField) as context:
+            raise MissingField("name")
+        assert str(context.exception) == "name"
+        assert context.exception.errors == []
+        assert MissingField(Person.get_fields()["name"]).errors == []
+        assert ValidationError().errors == []
+        assert ValidationError("a", "b").args == ("a", "b")
+        errors = [{"path": "name", "code": "missing", "message": "required"}]
+        assert str(ValidationError(errors)) == "name: required"
+        assert ValidationError("invalid", errors=errors).errors == errors
+        errors = Person.validate({**data, "age": 30}, strict=True)
+        assert [error["path"] for error in errors] == ["age"]
+
+    def test_load_unions(self) -> None:
+        class Shapes(Enum):
+            circle = 1
+            square = 2
+
+        @dataclass
+        class Circle(Contract):
+            radius: float
+            kind: Shapes = Shapes.circle
+
+        @dataclass
+        class Square(Contract):
+            side: float
+            kind: Shapes = Shapes.square
+
+        @dataclass
+        class Drawing(Contract):
+            shapes: List[Union[Circle, Square]]
+            label: Union[int, str, None]
+            owner: Optional[Person] = None
+
+        drawing = Drawing.load_from_dict(
+            {
+                "shapes": [{"radius": 1}, {"side": 2}, {"kind": "square", "side": 3}],
+                "label": "first",
+                "owner": None,
+            }
+        )
+        assert drawing.shapes == [Circle(1), Square(2), Square(3)]
+        assert drawing.owner is None
+        assert Drawing.load_from_dict({"shapes": [], "label": 1}).label == 1
+
+        errors = Drawing.validate({"shapes": [{"kind": "circle"}], "label": 1.5})
+        assert [(error["path"], error["code"]) for error in errors] == [
+            ("shapes[0].radius", "missing"),
+            ("label", "type"),
+        ]
+        assert errors[1]["message"] == "expected number|string|null, got float"
+
+        @dataclass
+        class Marked(Contract):
+            mark: Union[Shapes, Gender]
+
+        assert Marked.load_from_dict({"mark": "female"}).mark is Gender.female
+        assert Marked.load_from_dict({"mark": "square"}).mark is Shapes.square
+        errors = Marked.validate({"mark": "robot"})
+        assert [error["code"] for error in errors] == ["enum"]
+
+        @dataclass
+        class Note(Contract):
+            mark: Union[Gender, str]
+
+        assert Note.load_from_dict({"mark": "male"}).mark is Gender.male
+        assert Note.load_from_dict({"mark": "hello"}).mark == "hello"
+        assert Note.validate({"mark": "hello"}) == []
+
+    def test_slotted_contract(self) -> None:
+        @slotted
+        @dataclass
+        class Seat(Contract):
+            row: int
+            person: Person
+            tags: List[str] = field(default_factory=list)
+            label: str = ""
+
+        @slotted
+        @dataclass
+        class Booth(Seat):
+            price: Decimal = Decimal(0)
+
+        data = {
+            "row": 1,
+            "person": {
+                "name": "Bond",
+                "gender": "male",
+                "birth_date": "2000-01-01T00:00:00",
+            },
+            "price": "1.5",
+        }
+        booth = Booth.load_from_dict(data)
+        assert not hasattr(booth, "__dict__")
+        assert Booth.__slots__ == ("price",)
+        assert list(Booth.get_fields()) == ["row", "person", "tags", "label", "price"]
+        assert booth == Booth(1, booth.person, price=Decimal("1.5"))
+        assert booth.asdict()["price"] == Decimal("1.5")
+        assert to_primitive(booth)["person"]["name"] == "Bond"
+        with self.assertRaises(AttributeError):
+            booth.color = "red"  # type: ignore
+
+    def test_load_decoded_values(self) -> None:
+        @dataclass
+        class Receipt(Contract):
+            id: uuid.UUID
+            total: Decimal
+            paid_at: datetime.datetime
+            due_on: datetime.date
+            refunds: List[Decimal]
+
+        receipt = Receipt(
+            uuid.uuid4(),
+            Decimal("1.10"),
+            datetime.datetime(2000, 1, 1, 12, 30, tzinfo=datetime.timezone.utc),
+            datetime.date(2000, 2, 1),
+            [Decimal("0.1")],
+        )
+        assert Receipt.load_from_dict(to_primitive(receipt)) == receipt
+        assert Receipt.load_from_dict(asdict(receipt)) == receipt
+
+        data = {**to_primitive(receipt), "paid_at": "2000-01-01T12:30:00Z"}
+        assert Receipt.load_from_dict(data).paid_at == receipt.paid_at
+        assert Receipt.load_from_dict({**data, "refunds": [0.1]}).refunds == [
+            Decimal("0.1")
+        ]
+
+        data.update(id="nope", total="a lot", due_on="2000-02-30", refunds=[None])
+        errors = Receipt.validate(data)
+        assert [(error["path"], error["code"]) for error in errors] == [
+            ("id", "format"),
+            ("total", "format"),
+            ("due_on", "format"),
+            ("refunds[0]", "type"),
+        ]
+        # Loading checks the formats while parsing
+        assert Receipt.validate(data, formats=False) == [errors[-1]]
+        data["refunds"] = []
+        with self.assertRaises(ValidationError) as context:
+            Receipt.load_from_dict(data)
+        assert context.exception.errors == errors[:-1]
+
+    def test_load_dicts(self) -> None:
+        @dataclass
+        class Ledger(Contract):
+            balances: Dict[str, Decimal]
+            counts: Dict[str, int]
+            owners: Dict[str, Address]
+
+        ledger = Ledger.load_from_dict(
+            {
+                "balances": {"cash": "1.10"},
+                "counts": {"a": 1},
+                "owners": {"home": {"street": "easy street"}},
+            }
+        )
+        assert ledger == Ledger(
+            {"cash": Decimal("1.10")}, {"a": 1}, {"home": Address("easy street")}
+        )
+        assert Ledger.load_from_dict(to_primitive(ledger)) == ledger
+
+        errors = Ledger.validate(
+            {"balances": {"cash": "much"}, "counts": [], "owners": {"home": {}}}
+        )
+        assert [(error["path"], error["code"]) for error in errors] == [
+            ("balances.cash", "format"),
+            ("counts", "type"),
+            ("owners.home.street", "missing"),
+        ]
+        assert errors[1]["message"] == "expected {[key: string]: number}, got list"
+
+
+    def test_clean_request_data_override(self) -> None:
+        class LoadAddress(RequestResolver):
+            data: Address
+
+            def clean_request_data(self) -> None:
+                super().clean_request_data()
+                self.data = Address(self.data.street.upper())
+
+            def resolve(self) -> dict:
+                return {}
+
+        resolver = LoadAddress(None, {"street": "easy street"})
+        resolver.validate_data()
+        assert resolver.data == Address("EASY STREET")
+        with self.assertRaises(MissingField):
+            LoadAddress(None, {}).validate_data()
+
 
 class InstructorTestCase(TestCase):
     def test_instruction_serialize(self) -> None:
@@ -94,3 +381,224 @@ class InstructorTestCase(TestCase):
                 }
             ],
         }
+
+    def test_instruction_encode(self) -> None:
+        instruction = Instruction(
+            [
+                Operation.MERGE_APPEND(
+                    EntityTypes.jwt_auth_token,
+                    target_value=[
+                        Person(
+                            "Bond",
+                            Gender.male,
+                            datetime.datetime(2000, 1, 1),
+                            [Address("easy street")],
+                        )
+                    ],
+                )
+            ]
+        )
+        serialized = instruction.serialize()
+        assert json.loads(instruction.encode()) == serialized
+        assert serialized["operations"][0]["target_value"] == [
+            {
+                "name": "Bond",
+                "gender": "male",
+                "birth_date": "2000-01-01T00:00:00",
+                "addresses": [{"street": "easy street"}],
+            }
+        ]
+
+    def test_register_encoder(self) -> None:
+        class Cents:
+            def __init__(self, amount: int) -> None:
+                self.amount = amount
+
+        @dataclass
+        class Ticket(Contract):
+            price: Cents
+            issued_on: datetime.date
+
+        instruction = Instruction(
+            [
+                Operation.OVERWRITE(
+                    EntityTypes.jwt_auth_token,
+                    target_value=Ticket(Cents(150), datetime.date(2000, 1, 1)),
+                )
+            ]
+        )
+        with self.assertRaises(TypeError):
+            instruction.serialize()
+
+        register_encoder(Cents, lambda cents: cents.amount / 100)
+        assert instruction.serialize()["operations"][0]["target_value"] == {
+            "price": 1.5,
+            "issued_on": "2000-01-01",
+        }
+        assert json.loads(instruction.encode()) == instruction.serialize()
+
+    def test_columnar_operation(self) -> None:
+        addresses = [Address(str(number)) for number in range(3)]
+        people = [
+            Person("Bond", Gender.male, datetime.datetime(2000, 1, 1), addresses),
+            Person("Girl", Gender.female, datetime.datetime(2000, 1, 2)),
+        ]
+        columnar = Instruction(
+            [
+                Operation.MERGE_APPEND(EntityTypes.jwt_auth_token, people, True),
+                Operation.MERGE_PREPEND(EntityTypes.jwt_auth_token, [], True),
+            ]
+        ).serialize()
+        rows = Instruction(
+            [Operation.MERGE_APPEND(EntityTypes.jwt_auth_token, people)]
+        ).serialize()
+        target_value = columnar["operations"][0]["target_value"]
+        assert target_value == {
+            "__columns__": ["name", "gender", "birth_date", "addresses"],
+            "__values__": [
+                ["Bond", "Girl"],
+                ["male", "female"],
+                ["2000-01-01T00:00:00", "2000-01-02T00:00:00"],
+                [[{"street": "0"}, {"street": "1"}, {"street": "2"}], None],
+            ],
+        }
+        assert expand_columns(target_value) == rows["operations"][0]["target_value"]
+        assert columnar["operations"][1]["target_value"] == []
+
+        mixed = Operation.MERGE_APPEND(
+            EntityTypes.jwt_auth_token, people + addresses, columnar=True
+        )
+        with self.assertRaises(TypeError):
+            to_primitive(mixed)
+        with self.assertRaisesRegex(TypeError, "Columns of Person hold other"):
+            Instruction([mixed]).encode()
+
+        typescript = contracts_to_typescript(
+            dataclasses=[], redux_actions=[], import_plugins=False, columnar=True
+        )
+        assert typescript.startswith("export function expandColumns(value: any): any {")
+
+    def test_serialize_keys(self) -> None:
+        instruction = Instruction(
+            [Operation.OVERWRITE(EntityTypes.jwt_auth_token, {1: "a", None: True})]
+        )
+        assert instruction.serialize() == json.loads(instruction.encode())
+
+    def test_raw_json_fragments(self) -> None:
+        people = [Person("Bond", Gender.male, datetime.datetime(2000, 1, 1))]
+        builds = []
+
+        def build() -> list:
+            builds.append(1)
+            return people
+
+        fragment = cached_fragment("people", 1, build)
+        assert cached_fragment("people", 1, build) is fragment
+        assert len(builds) == 1
+        operations = [
+            Operation.OVERWRITE(EntityTypes.jwt_auth_token, people),
+            Operation.MERGE_APPEND(EntityTypes.jwt_auth_token, [fragment, people[0]]),
+        ]
+        expected = Instruction(operations).encode()
+        spliced = Instruction(
+            [
+                Operation.OVERWRITE(EntityTypes.jwt_auth_token, fragment),
+                Operation.MERGE_APPEND(
+                    EntityTypes.jwt_auth_token, [RawJSON.encode(people), people[0]]
+                ),
+            ]
+        )
+        assert json.loads(spliced.encode()) == json.loads(expected)
+        assert spliced.serialize() == json.loads(expected)
+
+        # A whole pre-encoded operation, streamed
+        streamed = Instruction(
+            [
+                RawJSON.encode(operations[0]),
+                Operation.MERGE_APPEND(EntityTypes.jwt_auth_token, iter(people)),
+            ]
+        )
+        assert streamed.is_streaming
+        assert json.loads("".join(streamed.iter_encode()))["operations"] == [
+            json.loads(expected)["operations"][0],
+            {
+                "verb": "MERGE_APPEND",
+                "entity_type": "jwt_auth_token",
+                "target_value": [to_primitive(people[0])],
+            },
+        ]
+
+        assert cached_fragment("people", 2, build) is not fragment
+        invalidate_fragment("people")
+        cached_fragment("people", 2, build)
+        assert len(builds) == 3
+
+    def test_patch_operations(self) -> None:
+        old = Person(
+            "Bond",
+            Gender.male,
+            datetime.datetime(2000, 1, 1),
+            [Address("0"), Address("1"), Address("2")],
+        )
+        new = Person(
+            "Bond/007", Gender.male, datetime.datetime(2000, 1, 1), [Address("zero")]
+        )
+        patch = diff_contracts(old, new)
+        assert patch == [
+            {"op": "replace", "path": "/name", "value": "Bond/007"},
+            {"op": "replace", "path": "/addresses/0/street", "value": "zero"},
+            {"op": "remove", "path": "/addresses/2"},
+            {"op": "remove", "path": "/addresses/1"},
+        ]
+        assert diff_contracts(old, old) == []
+        new.addresses = None
+        assert diff_contracts(old, new)[1:] == [
+            {"op": "replace", "path": "/addresses", "value": None}
+        ]
+
+        grown = Person(
+            "Bond", Gender.female, old.birth_date, old.addresses + [Address("3")]
+        )
+        patch_data = to_primitive(diff_contracts(old, grown))
+        assert apply_patch(to_primitive(old), patch_data) == to_primitive(grown)
+
+        serialized = Instruction(
+            [
+                Operation.PATCH(EntityTypes.jwt_auth_token, patch),
+                Operation.MERGE_BY_KEY(EntityTypes.jwt_auth_token, [old], key="name"),
+            ]
+        ).serialize()["operations"]
+        assert serialized[0]["verb"] == "PATCH"
+        assert serialized[1]["verb"] == "MERGE_BY_KEY"
+        assert serialized[1]["target_value"] == {
+            "key": "name",
+            "items": [to_primitive(old)],
+        }
+
+        typescript = contracts_to_typescript(
+            dataclasses=[], redux_actions=[], import_plugins=False, patch_verbs=True
+        )
+        assert "export function applyPatch(" in typescript
+        assert "export function mergeByKey(" in typescript
+
+    def test_instruction_iter_encode(self) -> None:
+        def make_instruction(target_value) -> Instruction:
+            return Instruction(
+                [
+                    Operation.OVERWRITE(EntityTypes.jwt_auth_token, "token"),
+                    Operation.MERGE_APPEND(EntityTypes.jwt_auth_token, target_value),
+                ],
+                errors=["oops"],
+            )
+
+        addresses = [Address(str(number)) for number in range(5)]
+        streamed = make_instruction(iter(addresses))
+        assert streamed.is_streaming
+        assert not make_instruction(addresses).is_streaming
+        assert (
+            "".join(streamed.iter_encode(chunk_size=2)).encode("utf-8")
+            == make_instruction(addresses).encode()
+        )
+        assert "".join(make_instruction(iter([])).iter_encode()) == json.dumps(
+            make_instruction([]).serialize()
+        )